@@ -0,0 +1,347 @@
+"""Module with room owners holding hot room state in memory.
+
+With ROOM_ACTORS enabled every room is owned by one of ROOM_OWNER_CHANNELS,
+chosen by consistent hashing of the room name. Each owner channel is served
+by a single run_room_owners process, which handles events of its rooms one
+at a time, so online users, typing users, recent messages and their readers
+change in one place. Presence is written through to redis and messages with
+reads to the database, so a restarted owner rebuilds the state from them.
+"""
+
+import bisect
+import hashlib
+from collections import Counter, OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from asgiref.sync import async_to_sync
+from channels.consumer import SyncConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from messenger.chat.inbox import notify_inbox_message, notify_inbox_read
+from messenger.chat.layers import release_room_layer_alias
+from messenger.chat.models import Message, RoomType
+from messenger.chat.room_cache import get_room
+
+
+def get_hash(key):
+    """Get position of the key on the hash ring.
+
+    Args:
+        key: string to hash.
+
+    Returns:
+        64-bit integer, the same in every process.
+    """
+    return int.from_bytes(hashlib.md5(key.encode('utf-8'), usedforsecurity=False).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring, adding or removing a node moves only its share of keys."""
+
+    def __init__(self, nodes, virtual_nodes):
+        """Create HashRing object.
+
+        Args:
+            nodes: names of the nodes;
+            virtual_nodes: points of every node on the ring.
+        """
+        points = sorted((get_hash(f'{node}#{index}'), node) for node in nodes for index in range(virtual_nodes))
+        self.hashes = [point_hash for point_hash, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def get_node(self, key):
+        """Get node owning the key.
+
+        Args:
+            key: string key.
+
+        Returns:
+            name of the node.
+        """
+        return self.nodes[bisect.bisect(self.hashes, get_hash(key)) % len(self.nodes)]
+
+
+@lru_cache(maxsize=None)
+def get_owner_ring(channels, virtual_nodes):
+    """Get hash ring of room owner channels.
+
+    Args:
+        channels: tuple of owner channel names;
+        virtual_nodes: points of every channel on the ring.
+
+    Returns:
+        hash ring.
+    """
+    return HashRing(channels, virtual_nodes)
+
+
+def get_room_owner_channel(room_name):
+    """Get channel of the process owning the room.
+
+    Args:
+        room_name: name of the chatroom.
+
+    Returns:
+        owner channel name.
+    """
+    ring = get_owner_ring(tuple(settings.ROOM_OWNER_CHANNELS), settings.ROOM_OWNER_VIRTUAL_NODES)
+    return ring.get_node(room_name)
+
+
+def send_to_room_owner(event_type, room_name, **fields):
+    """Send event to the owner of the room.
+
+    Args:
+        event_type: type of the owner event;
+        room_name: name of the chatroom;
+        fields: event data.
+    """
+    async_to_sync(get_channel_layer().send)(
+        get_room_owner_channel(room_name), {'type': event_type, 'room': room_name, **fields},
+    )
+
+
+class RoomState:
+    """State of the room kept by its owner."""
+
+    def __init__(self, room, layer_alias):
+        """Create RoomState object, loading checkpointed presence and recent messages.
+
+        Args:
+            room: the room;
+            layer_alias: alias of the channel layer the room uses.
+        """
+        self.room = room
+        self.layer_alias = layer_alias
+        self.members = {}
+        if room.type == RoomType.direct_messages:
+            self.members = dict(room.participant.values_list('id', 'username'))
+        # Sockets of every online user, redis only knows who is online.
+        self.online = Counter({
+            username.decode('utf-8'): 1 for username in settings.REDIS_CLIENT.smembers(self.onlines_key)
+        })
+        self.typing = set()
+        # Authors and readers of recent messages by message id, oldest first.
+        self.recent = OrderedDict()
+        recent_messages = Message.objects.filter(room=room).order_by('-id').values_list('id', 'user_id')
+        for message_id, user_id in reversed(recent_messages[:settings.ROOM_RECENT_MESSAGES]):
+            self.recent[message_id] = (user_id, set())
+        reads = Message.read_users.through.objects.filter(message_id__in=self.recent).values_list(
+            'message_id', 'user_id',
+        )
+        for message_id, user_id in reads:
+            self.recent[message_id][1].add(user_id)
+
+    @property
+    def onlines_key(self):
+        """Get redis key of the room online users.
+
+        Returns:
+            redis key name.
+        """
+        return f'{self.room.name}_onlines'
+
+    @property
+    def group_name(self):
+        """Get name of the group with chatbox sockets of the room.
+
+        Returns:
+            group name.
+        """
+        return f'chat_{self.room.name}'
+
+    def group_send(self, event):
+        """Send event to chatbox sockets of the room.
+
+        Args:
+            event: event to send.
+        """
+        async_to_sync(get_channel_layer(self.layer_alias).group_send)(self.group_name, event)
+
+    def send_online_user_list(self):
+        """Send list of users online."""
+        self.group_send({'type': 'online_users', 'users': list(self.online)})
+
+    def get_peer_ids(self, user_id):
+        """Get ids of other members of direct room.
+
+        Args:
+            user_id: id of the member.
+
+        Returns:
+            list of ids, empty for common channels.
+        """
+        return [member_id for member_id in self.members if member_id != user_id]
+
+    def remember_message(self, message_id, user_id):
+        """Add message to recent ones, forgetting the oldest.
+
+        Args:
+            message_id: id of the message;
+            user_id: id of the author.
+        """
+        # Message manager marks new messages read by their author.
+        self.recent[message_id] = (user_id, {user_id})
+        while len(self.recent) > settings.ROOM_RECENT_MESSAGES:
+            self.recent.popitem(last=False)
+
+
+class RoomOwnerConsumer(SyncConsumer):
+    """Consumer of an owner channel, serializing state changes of its rooms."""
+
+    def __init__(self, *args, **kwargs):
+        """Create RoomOwnerConsumer object."""
+        super().__init__(*args, **kwargs)
+        self.rooms = {}
+
+    def get_room_state(self, event):
+        """Get state of the event room, loading it on first event.
+
+        Args:
+            event: owner event.
+
+        Returns:
+            room state or None if room doesn't exist.
+        """
+        state = self.rooms.get(event['room'])
+        if state is None:
+            room = get_room(event['room'])
+            if room is None:
+                return None
+            state = self.rooms[event['room']] = RoomState(room, event['layer'])
+        return state
+
+    def room_join(self, event):
+        """Add socket of the user to online ones.
+
+        Args:
+            event: join event with room, layer and username.
+        """
+        state = self.get_room_state(event)
+        if state is None:
+            return
+        if not state.online[event['username']]:
+            settings.REDIS_CLIENT.sadd(state.onlines_key, bytes(event['username'], 'utf-8'))
+        state.online[event['username']] += 1
+        state.group_send({'type': 'user_join', 'user': event['username']})
+        state.send_online_user_list()
+
+    def room_leave(self, event):
+        """Remove socket of the user, unloading the room when nobody is online.
+
+        Args:
+            event: leave event with room, layer and username.
+        """
+        state = self.get_room_state(event)
+        if state is None:
+            return
+        state.group_send({'type': 'user_leave', 'user': event['username']})
+        state.online[event['username']] -= 1
+        if state.online[event['username']] <= 0:
+            del state.online[event['username']]
+            settings.REDIS_CLIENT.srem(state.onlines_key, bytes(event['username'], 'utf-8'))
+            self.stop_typing(state, event['username'])
+        state.send_online_user_list()
+        if not state.online:
+            del self.rooms[event['room']]
+            release_room_layer_alias(event['room'])
+
+    def room_message(self, event):
+        """Save new message and send it to the room.
+
+        Args:
+            event: message event with room, layer, user_id, username and text.
+        """
+        state = self.get_room_state(event)
+        if state is None:
+            return
+        message = Message.objects.create(user_id=event['user_id'], room=state.room, text=event['text'])
+        state.remember_message(message.id, event['user_id'])
+        notify_inbox_message(state.room, event['username'], message)
+        state.group_send({
+            'type': 'chat_message',
+            'messages': [{
+                'user': event['username'],
+                'message': message.text,
+                'message_id': message.id,
+                'time': datetime.strftime(message.timestamp, '%H:%M'),
+                'date': datetime.strftime(message.timestamp, '%d.%b.%Y'),
+                'read_message': False,
+            }],
+        })
+
+    def room_read(self, event):
+        """Mark message read by the user, readers of recent messages are known without queries.
+
+        Args:
+            event: read event with room, layer, user_id and message_id.
+        """
+        state = self.get_room_state(event)
+        if state is None:
+            return
+        if event['message_id'] in state.recent:
+            author_id, read_user_ids = state.recent[event['message_id']]
+            if event['user_id'] in read_user_ids:
+                return
+            message = Message(pk=event['message_id'], room=state.room, user_id=author_id)
+            message.read_users.add(event['user_id'])
+            read_user_ids.add(event['user_id'])
+            read_count = len(read_user_ids)
+        else:
+            message = Message.objects.filter(pk=event['message_id'], room=state.room).first()
+            if message is None or message.read_users.filter(id=event['user_id']).exists():
+                return
+            message.read_users.add(event['user_id'])
+            read_count = message.read_users.count()
+        peer_ids = state.get_peer_ids(event['user_id'])
+        notify_inbox_read(event['user_id'], state.room.name, state.members[peer_ids[0]] if peer_ids else None)
+        if read_count == 2:
+            state.group_send({'type': 'read_message', 'message_id': event['message_id']})
+
+    def room_typing(self, event):
+        """Send notice about typing user if the user wasn't typing.
+
+        Args:
+            event: typing event with room, layer and username.
+        """
+        state = self.get_room_state(event)
+        if state is None or event['username'] in state.typing:
+            return
+        state.typing.add(event['username'])
+        state.group_send({
+            'type': 'user_typing',
+            'user': event['username'],
+            'message': f'{event["username"]} печатает...',
+        })
+
+    def room_stop_typing(self, event):
+        """Remove user from typing ones.
+
+        Args:
+            event: stop typing event with room, layer and username.
+        """
+        state = self.get_room_state(event)
+        if state is not None:
+            self.stop_typing(state, event['username'])
+
+    def stop_typing(self, state, username):
+        """Remove user from typing ones, showing another typing user if any.
+
+        Args:
+            state: room state;
+            username: name of the user.
+        """
+        if username not in state.typing:
+            return
+        state.typing.discard(username)
+        if not state.typing:
+            state.group_send({'type': 'user_stop_typing', 'message': None})
+            return
+        typing_username = next(iter(state.typing))
+        state.group_send({
+            'type': 'user_typing',
+            'user': typing_username,
+            'message': f'{typing_username} печатает...',
+        })
@@ -1,19 +1,138 @@
 """Module with configuration of admin panel for chat app."""
 
+import json
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from messenger.chat.models import Message, Room
 
+# Smaller results are counted exactly, estimates are rough for them.
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using planner row estimate instead of COUNT(*) for big results."""
+
+    @cached_property
+    def count(self):
+        """Get estimated number of objects, exact for small results.
+
+        Returns:
+            number of objects.
+        """
+        queryset = self.object_list
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().count
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class RoomNameFilter(admin.SimpleListFilter):
+    """Filter by exact room name resolved through unique index, without listing rooms."""
+
+    title = 'room'
+    parameter_name = 'room'
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        """Get filter choices, room name is typed instead.
+
+        Args:
+            request: current request;
+            model_admin: admin of filtered model.
+
+        Returns:
+            empty choices.
+        """
+        return ()
+
+    def has_output(self):
+        """Show filter without choices.
+
+        Returns:
+            True.
+        """
+        return True
+
+    def choices(self, changelist):
+        """Get data for filter form.
+
+        Args:
+            changelist: current changelist.
+
+        Yields:
+            filter value and other query parameters to keep.
+        """
+        yield {
+            'value': self.value() or '',
+            'hidden_params': [
+                (key, param) for key, param in changelist.params.items() if key not in {self.parameter_name, 'p'}
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        """Filter messages of the room.
+
+        Args:
+            request: current request;
+            queryset: messages queryset.
+
+        Returns:
+            filtered queryset.
+        """
+        if not self.value():
+            return queryset
+        room_id = Room.all_objects.filter(name=self.value()).values_list('id', flat=True).first()
+        if room_id is None:
+            return queryset.none()
+        return queryset.filter(room_id=room_id)
+
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
     """Admin panel configuration for Room model."""
 
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'type', 'members_count', 'deleted_at')
+    list_filter = ('type',)
+    search_fields = ('=name',)
+    ordering = ('-id',)
+    sortable_by = ('id', 'members_count')
+    raw_id_fields = ('participant',)
+    readonly_fields = ('members_count',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """Get rooms including soft deleted ones waiting for purge.
+
+        Args:
+            request: current request.
+
+        Returns:
+            queryset of all rooms.
+        """
+        queryset = Room.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     """Admin panel configuration for Message model."""
 
-    list_display = ('id', 'user', 'text', 'timestamp')
+    list_display = ('id', 'user', 'room', 'text', 'timestamp')
+    list_select_related = ('user', 'room')
+    list_filter = (RoomNameFilter, ('timestamp', admin.DateFieldListFilter))
+    ordering = ('-id',)
+    sortable_by = ('id',)
+    raw_id_fields = ('user', 'room', 'read_users')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'messenger.chat'
+
+    def ready(self):
+        from messenger.chat import signals  # noqa: F401
@@ -0,0 +1,292 @@
+"""Module with cold storage archive of old messages.
+
+Messages older than the retention period are moved out of the database
+into gzip compressed segments, one directory per room. Segments are never
+changed after they are written, and every room keeps an append-only
+index.jsonl with id and timestamp ranges of its segments.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from messenger.chat.models import Message
+
+User = get_user_model()
+ReadUsers = Message.read_users.through
+
+INDEX_FILE_NAME = 'index.jsonl'
+
+
+def get_room_archive_dir(room_id):
+    """Get directory with archive of the room.
+
+    Args:
+        room_id: id of the room.
+
+    Returns:
+        path to the directory.
+    """
+    return Path(settings.MESSAGE_ARCHIVE_DIR) / str(room_id)
+
+
+@lru_cache(maxsize=1024)
+def load_index(index_path, mtime_ns, size):
+    """Load archive index, cached until index file changes.
+
+    Args:
+        index_path: path to the index file;
+        mtime_ns: modification time of the file;
+        size: size of the file.
+
+    Returns:
+        tuple of segment entries ordered by ids.
+    """
+    with open(index_path, encoding='utf-8') as index_file:
+        lines = index_file.read().split('\n')
+    # The last line may be cut by a crash while appending, it is not committed.
+    return tuple(json.loads(line) for line in lines[:-1] if line)
+
+
+def read_index(room_id):
+    """Get segment entries of the room archive.
+
+    Args:
+        room_id: id of the room.
+
+    Returns:
+        tuple of segment entries ordered by ids.
+    """
+    index_path = get_room_archive_dir(room_id) / INDEX_FILE_NAME
+    try:
+        index_stat = index_path.stat()
+    except FileNotFoundError:
+        return ()
+    return load_index(str(index_path), index_stat.st_mtime_ns, index_stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def load_segment(segment_path):
+    """Load records of the archive segment, segments are immutable.
+
+    Args:
+        segment_path: path to the segment file.
+
+    Returns:
+        tuple of message records ordered by id.
+    """
+    with gzip.open(segment_path, 'rt', encoding='utf-8') as segment_file:
+        return tuple(json.loads(line) for line in segment_file)
+
+
+def get_last_archived_id(room_id):
+    """Get id of the newest archived message of the room.
+
+    Args:
+        room_id: id of the room.
+
+    Returns:
+        message id or None if nothing is archived.
+    """
+    index = read_index(room_id)
+    return index[-1]['last_id'] if index else None
+
+
+def build_message(record, room_id, user_id):
+    """Build unsaved Message object from archive record.
+
+    Args:
+        record: archived message record;
+        room_id: id of the room;
+        user_id: id of the user messages are shown to.
+
+    Returns:
+        Message object read or not by the user.
+    """
+    message = Message(
+        id=record['id'],
+        room_id=room_id,
+        text=record['text'],
+        timestamp=datetime.fromisoformat(record['timestamp']),
+    )
+    message.user = User(id=record['user_id'], username=record['username'])
+    message.read = user_id in record['read_user_ids']
+    return message
+
+
+def get_archived_messages(room_id, min_id, max_id, user_id):
+    """Get archived messages of the room with ids in range.
+
+    Args:
+        room_id: id of the room;
+        min_id: lowest message id;
+        max_id: highest message id;
+        user_id: id of the user messages are shown to.
+
+    Returns:
+        list of unsaved Message objects, newest first.
+    """
+    archive_dir = get_room_archive_dir(room_id)
+    messages = []
+    for entry in read_index(room_id):
+        if entry['last_id'] < min_id or entry['first_id'] > max_id:
+            continue
+        messages.extend(
+            build_message(record, room_id, user_id)
+            for record in load_segment(str(archive_dir / entry['file']))
+            if min_id <= record['id'] <= max_id
+        )
+    return sorted(messages, key=lambda message: message.id, reverse=True)
+
+
+def get_retention_cutoff(room):
+    """Get time before which messages of the room are archived.
+
+    Args:
+        room: room to archive.
+
+    Returns:
+        cutoff datetime or None if room messages are kept forever.
+    """
+    retention_days = room.retention_days if room.retention_days is not None else settings.MESSAGE_RETENTION_DAYS
+    if not retention_days:
+        return None
+    return timezone.now() - timedelta(days=retention_days)
+
+
+def append_index_entry(index_path, entry):
+    """Append segment entry to the index, dropping a line cut by crash.
+
+    Args:
+        index_path: path to the index file;
+        entry: segment entry to append.
+    """
+    with open(index_path, 'a+b') as index_file:
+        index_file.seek(0)
+        content = index_file.read()
+        if content and not content.endswith(b'\n'):
+            index_file.truncate(content.rfind(b'\n') + 1)
+        index_file.write(json.dumps(entry).encode('utf-8') + b'\n')
+        index_file.flush()
+        os.fsync(index_file.fileno())
+
+
+def write_segment(room_id, messages, read_user_ids):
+    """Write messages to a new archive segment and register it in the index.
+
+    Args:
+        room_id: id of the room;
+        messages: messages ordered by id;
+        read_user_ids: dictionary with ids of users read each message.
+    """
+    archive_dir = get_room_archive_dir(room_id)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    file_name = f'{messages[0].id:020d}-{messages[-1].id:020d}.jsonl.gz'
+    temp_path = archive_dir / f'{file_name}.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as segment_file:
+        for message in messages:
+            segment_file.write(json.dumps({
+                'id': message.id,
+                'user_id': message.user_id,
+                'username': message.user.username,
+                'text': message.text,
+                'timestamp': message.timestamp.isoformat(),
+                'read_user_ids': read_user_ids[message.id],
+            }) + '\n')
+    with open(temp_path, 'rb') as segment_file:
+        checksum = hashlib.sha256(segment_file.read()).hexdigest()
+        os.fsync(segment_file.fileno())
+    os.replace(temp_path, archive_dir / file_name)
+    append_index_entry(archive_dir / INDEX_FILE_NAME, {
+        'file': file_name,
+        'first_id': messages[0].id,
+        'last_id': messages[-1].id,
+        'first_timestamp': messages[0].timestamp.isoformat(),
+        'last_timestamp': messages[-1].timestamp.isoformat(),
+        'count': len(messages),
+        'sha256': checksum,
+    })
+
+
+def archive_room(room, batch_size):
+    """Move messages of the room older than retention period to archive.
+
+    Each batch is written to the archive before it is deleted from the
+    database. Messages already covered by the index are only deleted, so
+    archiving interrupted between the two steps can be run again.
+
+    Args:
+        room: room to archive;
+        batch_size: maximum number of messages per segment.
+
+    Returns:
+        number of archived messages.
+    """
+    cutoff = get_retention_cutoff(room)
+    if cutoff is None:
+        return 0
+    archived = 0
+    while True:
+        batch = list(
+            Message.objects.filter(room=room, timestamp__lt=cutoff).select_related('user').order_by('id')[:batch_size],
+        )
+        if not batch:
+            return archived
+        batch_ids = [message.id for message in batch]
+        index = read_index(room.id)
+        last_archived_id = index[-1]['last_id'] if index else 0
+        to_archive = [message for message in batch if message.id > last_archived_id]
+        if to_archive:
+            read_user_ids = defaultdict(list)
+            read_rows = ReadUsers.objects.filter(message_id__in=batch_ids).values_list('message_id', 'user_id')
+            for message_id, user_id in read_rows:
+                read_user_ids[message_id].append(user_id)
+            write_segment(room.id, to_archive, read_user_ids)
+        with transaction.atomic():
+            ReadUsers.objects.filter(message_id__in=batch_ids).delete()
+            Message.objects.filter(id__in=batch_ids).delete()
+        archived += len(to_archive)
+
+
+def verify_room_archive(room_id):
+    """Check archive segments of the room against its index.
+
+    Args:
+        room_id: id of the room.
+
+    Returns:
+        list of found problems.
+    """
+    archive_dir = get_room_archive_dir(room_id)
+    errors = []
+    previous_last_id = 0
+    for entry in read_index(room_id):
+        segment_path = archive_dir / entry['file']
+        if not segment_path.exists():
+            errors.append(f'{entry["file"]} is missing')
+            continue
+        with open(segment_path, 'rb') as segment_file:
+            if hashlib.sha256(segment_file.read()).hexdigest() != entry['sha256']:
+                errors.append(f'{entry["file"]} checksum mismatch')
+                continue
+        record_ids = [record['id'] for record in load_segment(str(segment_path))]
+        if record_ids != sorted(record_ids) or len(record_ids) != entry['count']:
+            errors.append(f'{entry["file"]} records do not match index')
+        elif record_ids[0] != entry['first_id'] or record_ids[-1] != entry['last_id']:
+            errors.append(f'{entry["file"]} id range does not match index')
+        if entry['first_id'] <= previous_last_id:
+            errors.append(f'{entry["file"]} overlaps previous segment')
+        previous_last_id = entry['last_id']
+    if previous_last_id and Message.objects.filter(room_id=room_id, id__lte=previous_last_id).exists():
+        errors.append('archived messages are still in the database, run archiving again')
+    return errors
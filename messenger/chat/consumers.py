@@ -5,12 +5,28 @@ from datetime import datetime
 from itertools import chain
 from django.conf import settings
 from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
 from channels.generic.websocket import WebsocketConsumer
 from django.db.models import Q
 
-from messenger.chat.models import Message, Room
+from messenger.chat.actors import send_to_room_owner
+from messenger.chat.archive import get_archived_messages, get_last_archived_id
+from messenger.chat.inbox import get_inbox_group_name, notify_inbox_message, notify_inbox_read
+from messenger.chat.layers import choose_room_layer_alias, pin_room_layer_alias, release_room_layer_alias
+from messenger.chat.models import Message, RoomType
+from messenger.chat.participants import get_participants_page
+from messenger.chat.presence import add_inbox_online, remove_inbox_online, remove_online, track_online
+from messenger.chat.room_cache import get_room
+from messenger.chat.routers import pin_to_primary, replica_reads
 
 MESSAGES_PAGINATE = 20
+# Owner events for socket events changing room state in room actors mode.
+OWNER_EVENT_TYPES = {
+    'chat_message': 'room.message',
+    'user_typing': 'room.typing',
+    'user_stop_typing': 'room.stop_typing',
+    'read_message': 'room.read',
+}
 
 
 class ChatConsumer(WebsocketConsumer):
@@ -27,6 +43,19 @@ class ChatConsumer(WebsocketConsumer):
         self.start_msgs = None
         self.down_zero_msg_id = 0
         self.up_zero_msg_id = 0
+        self.direct_peers = []
+
+    async def __call__(self, scope, receive, send):
+        """Choose channel layer for the room before consumer starts.
+
+        Args:
+            scope: connection scope;
+            receive: awaitable to receive events;
+            send: awaitable to send events.
+        """
+        room_name = scope['url_route']['kwargs']['room_name']
+        self.channel_layer_alias = await database_sync_to_async(choose_room_layer_alias)(room_name)
+        await super().__call__(scope, receive, send)
 
     def get_start_messages(self, room_name):
         """Get messages for start with chatbox.
@@ -61,7 +90,8 @@ class ChatConsumer(WebsocketConsumer):
                 for msg in start_msgs:
                     msg.read = msg.read_users.count() != 1
             else:
-                self.up_zero_msg_id = 0
+                # Archived messages are still paginated up when every message is archived.
+                self.up_zero_msg_id = (get_last_archived_id(self.room.id) or 0) + 1
                 self.down_zero_msg_id = 0
                 return None, unread_to_paginate
         for message in start_msgs:
@@ -105,10 +135,11 @@ class ChatConsumer(WebsocketConsumer):
         end_paginate = self.up_zero_msg_id - (MESSAGES_PAGINATE * page)
         if end_paginate <= 0:
             end_paginate = 1
-        messages = Message.objects.filter(Q(id__lte=start_paginate, id__gte=end_paginate), room=self.room)
+        messages = list(Message.objects.filter(Q(id__lte=start_paginate, id__gte=end_paginate), room=self.room))
         for msg in messages:
             msg.read = Message.objects.filter(pk=msg.id, read_users__id=self.scope['user'].id).exists()
-        return messages
+        archived_messages = get_archived_messages(self.room.id, end_paginate, start_paginate, self.scope['user'].id)
+        return sorted(chain(messages, archived_messages), key=lambda instance: instance.id, reverse=True)
 
     def send_online_user_list(self):
         """Send list of users online."""
@@ -120,26 +151,71 @@ class ChatConsumer(WebsocketConsumer):
             },
         )
 
+    def send_to_owner(self, event_type, **fields):
+        """Send event of the socket user to the room owner.
+
+        Args:
+            event_type: type of the owner event;
+            fields: event data.
+        """
+        send_to_room_owner(
+            event_type,
+            self.room_name,
+            layer=self.channel_layer_alias,
+            user_id=self.user.id,
+            username=self.user.username,
+            **fields,
+        )
+
+    def forward_to_owner(self, text_data_json):
+        """Pass event changing room state to the room owner.
+
+        Args:
+            text_data_json: event from frontend.
+        """
+        fields = {}
+        if text_data_json['type'] == 'chat_message':
+            fields['text'] = text_data_json['message']
+        if text_data_json['type'] == 'read_message':
+            fields['message_id'] = int(text_data_json['id'])
+        self.send_to_owner(OWNER_EVENT_TYPES[text_data_json['type']], **fields)
+        if fields:
+            pin_to_primary(self.user)
+
     def connect(self):
         """Consume socket connect."""
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
-        self.room = Room.objects.get(name=self.room_name)
+        self.room = get_room(self.room_name)
         self.user = self.scope['user']
+        if self.room is None:
+            self.close()
+            return
+        username = '' if settings.ROOM_ACTORS else self.user.username
+        if pin_room_layer_alias(self.room_name, self.channel_layer_alias, username) != self.channel_layer_alias:
+            # Room moved to another layer since it was chosen, the client reconnects to it.
+            self.room = None
+            self.close()
+            return
+        if not settings.ROOM_ACTORS:
+            track_online(self.room_name, self.user.username)
+        if self.room.type == RoomType.direct_messages:
+            self.direct_peers = list(self.room.participant.exclude(id=self.user.id).values_list('id', 'username'))
         self.accept()
 
-        messages, unread_count = self.get_start_messages(self.room_name)
-        self.start_msgs = [
-            {
-                'message_id': msg.id,
-                'message': msg.text,
-                'user': msg.user.username,
-                'time': msg.time,
-                'date': msg.date,
-                'read_message': msg.read,
-            }
-            for msg in messages
-        ] if messages else None
+        with replica_reads(self.user):
+            messages, unread_count = self.get_start_messages(self.room_name)
+            self.start_msgs = [
+                {
+                    'message_id': msg.id,
+                    'message': msg.text,
+                    'user': msg.user.username,
+                    'time': msg.time,
+                    'date': msg.date,
+                    'read_message': msg.read,
+                }
+                for msg in messages
+            ] if messages else None
         self.unread_count = unread_count
 
         async_to_sync(self.channel_layer.send)(
@@ -152,10 +228,12 @@ class ChatConsumer(WebsocketConsumer):
         )
 
         async_to_sync(self.channel_layer.group_add)(self.room_group_name, self.channel_name)
+        if settings.ROOM_ACTORS:
+            self.send_to_owner('room.join')
+            return
         async_to_sync(self.channel_layer.group_send)(
             self.room_group_name, {'type': 'user_join', 'user': self.user.username},
         )
-        settings.REDIS_CLIENT.sadd(f'{self.room_name}_onlines', bytes(self.user.username, 'utf-8'))
         self.send_online_user_list()
 
     def disconnect(self, close_code):
@@ -164,13 +242,19 @@ class ChatConsumer(WebsocketConsumer):
         Args:
             close_code: code socket closed with.
         """
+        if self.room is None:
+            return
         async_to_sync(self.channel_layer.group_discard)(self.room_group_name, self.channel_name)
+        if settings.ROOM_ACTORS:
+            self.send_to_owner('room.leave')
+            return
         async_to_sync(self.channel_layer.group_send)(
             self.room_group_name, {'type': 'user_leave', 'user': self.user.username},
         )
 
-        settings.REDIS_CLIENT.srem(f'{self.room_name}_onlines', bytes(self.user.username, 'utf-8'))
+        remove_online(self.room_name, self.user.username)
         self.send_online_user_list()
+        release_room_layer_alias(self.room_name)
 
     def receive(self, text_data=None, bytes_data=None):
         """Consume socket receiving.
@@ -184,9 +268,15 @@ class ChatConsumer(WebsocketConsumer):
         if not self.user.is_authenticated:
             return
 
+        if settings.ROOM_ACTORS and text_data_json['type'] in OWNER_EVENT_TYPES:
+            self.forward_to_owner(text_data_json)
+            return
+
         if text_data_json['type'] == 'chat_message':
             message = text_data_json['message']
             new_message = Message.objects.create(user=self.user, room=self.room, text=message)
+            pin_to_primary(self.user)
+            notify_inbox_message(self.room, self.user.username, new_message)
             async_to_sync(self.channel_layer.group_send)(
                 self.room_group_name,
                 {
@@ -222,18 +312,19 @@ class ChatConsumer(WebsocketConsumer):
             )
 
         if text_data_json['type'] == 'paginate_up':
-            messages = self.get_paginate_up(page=text_data_json['page'])
-            messages = [
-                {
-                    'message_id': msg.id,
-                    'message': msg.text,
-                    'user': msg.user.username,
-                    'time': datetime.strftime(msg.timestamp, '%H:%M'),
-                    'date': datetime.strftime(msg.timestamp, '%d.%b.%Y'),
-                    'read_message': msg.read,
-                }
-                for msg in messages
-            ]
+            with replica_reads(self.user):
+                messages = self.get_paginate_up(page=text_data_json['page'])
+                messages = [
+                    {
+                        'message_id': msg.id,
+                        'message': msg.text,
+                        'user': msg.user.username,
+                        'time': datetime.strftime(msg.timestamp, '%H:%M'),
+                        'date': datetime.strftime(msg.timestamp, '%d.%b.%Y'),
+                        'read_message': msg.read,
+                    }
+                    for msg in messages
+                ]
 
             async_to_sync(self.channel_layer.send)(
                 self.channel_name,
@@ -244,18 +335,19 @@ class ChatConsumer(WebsocketConsumer):
             )
 
         if text_data_json['type'] == 'paginate_down':
-            messages, count = self.get_paginate_down(page=text_data_json['page'])
-            messages = [
-                {
-                    'message_id': msg.id,
-                    'message': msg.text,
-                    'user': msg.user.username,
-                    'time': datetime.strftime(msg.timestamp, '%H:%M'),
-                    'date': datetime.strftime(msg.timestamp, '%d.%b.%Y'),
-                    'read_message': msg.read,
-                }
-                for msg in messages
-            ]
+            with replica_reads(self.user):
+                messages, count = self.get_paginate_down(page=text_data_json['page'])
+                messages = [
+                    {
+                        'message_id': msg.id,
+                        'message': msg.text,
+                        'user': msg.user.username,
+                        'time': datetime.strftime(msg.timestamp, '%H:%M'),
+                        'date': datetime.strftime(msg.timestamp, '%d.%b.%Y'),
+                        'read_message': msg.read,
+                    }
+                    for msg in messages
+                ]
 
             async_to_sync(self.channel_layer.send)(
                 self.channel_name,
@@ -266,9 +358,28 @@ class ChatConsumer(WebsocketConsumer):
                 },
             )
 
+        if text_data_json['type'] == 'participants':
+            with replica_reads(self.user):
+                participants, cursor = get_participants_page(self.room, text_data_json.get('cursor'))
+            async_to_sync(self.channel_layer.send)(
+                self.channel_name,
+                {
+                    'type': 'participants',
+                    'users': participants,
+                    'cursor': cursor,
+                    'count': self.room.members_count,
+                },
+            )
+
         if text_data_json['type'] == 'read_message':
-            message = Message.objects.get(pk=text_data_json['id'])
-            message.read_users.add(self.scope['user'])
+            message = Message.objects.filter(pk=text_data_json['id']).first()
+            if message is None:
+                return
+            if not message.read_users.filter(id=self.user.id).exists():
+                message.read_users.add(self.scope['user'])
+                pin_to_primary(self.user)
+                peer_username = self.direct_peers[0][1] if self.direct_peers else None
+                notify_inbox_read(self.user.id, self.room_name, peer_username)
             if message.read_users.count() == 2:
                 async_to_sync(self.channel_layer.group_send)(
                     self.room_group_name,
@@ -365,3 +476,61 @@ class ChatConsumer(WebsocketConsumer):
             event: read message.
         """
         self.send(text_data=json.dumps(event))
+
+    def participants(self, event):
+        """Send page of room participants.
+
+        Args:
+            event: participants page.
+        """
+        self.send(text_data=json.dumps(event))
+
+
+class InboxConsumer(WebsocketConsumer):
+    """Consumer pushing unread counts and last activity to room lists."""
+
+    def __init__(self, *args, **kwargs):
+        """Create InboxConsumer object."""
+        super().__init__(*args, **kwargs)
+        self.user = None
+        self.groups_names = []
+
+    def connect(self):
+        """Consume socket connect."""
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            self.close()
+            return
+        self.groups_names = [get_inbox_group_name(self.user.id)]
+        for group_name in self.groups_names:
+            async_to_sync(self.channel_layer.group_add)(group_name, self.channel_name)
+        add_inbox_online(self.user.id)
+        self.accept()
+
+    def disconnect(self, close_code):
+        """Consume socket disconnect.
+
+        Args:
+            close_code: code socket closed with.
+        """
+        if not self.groups_names:
+            return
+        remove_inbox_online(self.user.id)
+        for group_name in self.groups_names:
+            async_to_sync(self.channel_layer.group_discard)(group_name, self.channel_name)
+
+    def inbox_message(self, event):
+        """Send notice about new message in one of user rooms.
+
+        Args:
+            event: new message notice.
+        """
+        self.send(text_data=json.dumps(event))
+
+    def inbox_read(self, event):
+        """Send notice about message read by user.
+
+        Args:
+            event: read message notice.
+        """
+        self.send(text_data=json.dumps(event))
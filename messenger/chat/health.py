@@ -0,0 +1,64 @@
+"""Module with readiness checks of services the chat depends on."""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections
+
+READINESS_CHECK_EVENT = 'readiness.check'
+# Check channel by layer alias and event loop, pubsub layer keeps subscriptions
+# of every new channel until the process exits, so probes reuse one channel.
+check_channels = {}
+
+
+def check_database():
+    """Run trivial query on every configured database.
+
+    Raises:
+        DatabaseError: if database is unreachable.
+    """
+    for alias in settings.DATABASES:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+async def check_channel_layer(alias):
+    """Send event to the check channel of the layer and receive it back.
+
+    Args:
+        alias: alias of the channel layer.
+
+    Raises:
+        RuntimeError: if received event differs from sent one.
+    """
+    channel_layer = get_channel_layer(alias)
+    # Layers bind channels to the event loop they were created in.
+    check_key = (alias, asyncio.get_running_loop())
+    channel_name = check_channels.get(check_key)
+    if channel_name is None:
+        channel_name = check_channels[check_key] = await channel_layer.new_channel()
+    await channel_layer.send(channel_name, {'type': READINESS_CHECK_EVENT})
+    message = await channel_layer.receive(channel_name)
+    if message.get('type') != READINESS_CHECK_EVENT:
+        raise RuntimeError('Unexpected channel layer message.')
+
+
+async def run_readiness_checks():
+    """Run all readiness checks.
+
+    Returns:
+        dictionary with 'ok' or error description by check name.
+    """
+    checks = {'database': sync_to_async(check_database)()}
+    for alias in settings.CHANNEL_LAYERS:
+        checks[f'channel_layer:{alias}'] = check_channel_layer(alias)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(check, settings.READINESS_CHECK_TIMEOUT) for check in checks.values()),
+        return_exceptions=True,
+    )
+    return {
+        name: 'ok' if result is None else repr(result)
+        for name, result in zip(checks, results)
+    }
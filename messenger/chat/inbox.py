@@ -0,0 +1,241 @@
+"""Module maintaining per-user inbox summaries of rooms."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from messenger.chat.models import INBOX_PREVIEW_LENGTH, InboxEntry, Message, Room, RoomType
+from messenger.chat.presence import get_inbox_online_user_ids
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_ENTRY_ID = 2 ** 63 - 1
+
+
+def get_inbox_group_name(user_id):
+    """Get name of the group with inbox sockets of the user.
+
+    Args:
+        user_id: id of the user.
+
+    Returns:
+        group name.
+    """
+    return f'inbox_{user_id}'
+
+
+def notify_inbox_message(room, username, message):
+    """Send new message notice to inbox sockets of room members, except the author.
+
+    Inbox groups live on the default channel layer, whichever layer the
+    room uses. Only members with open inbox sockets are sent to.
+
+    Args:
+        room: room of the message;
+        username: name of the message author;
+        message: created message.
+    """
+    event = {
+        'type': 'inbox_message',
+        'room': room.name,
+        'user': username,
+        'preview': message.text[:INBOX_PREVIEW_LENGTH],
+        'time': datetime.strftime(message.timestamp, '%H:%M'),
+        'date': datetime.strftime(message.timestamp, '%d.%b.%Y'),
+    }
+    if room.type == RoomType.direct_messages:
+        event['peer'] = username
+    member_ids = Room.participant.through.objects.filter(room_id=room.id).exclude(
+        user_id=message.user_id,
+    ).values_list('user_id', flat=True)
+    online_user_ids = get_inbox_online_user_ids(list(member_ids))
+    if online_user_ids:
+        async_to_sync(send_to_inbox_groups)(online_user_ids, event)
+
+
+async def send_to_inbox_groups(user_ids, event):
+    """Send event to inbox sockets of the users concurrently.
+
+    Args:
+        user_ids: ids of the users;
+        event: event to send.
+    """
+    channel_layer = get_channel_layer()
+    await asyncio.gather(*(
+        channel_layer.group_send(get_inbox_group_name(user_id), event) for user_id in user_ids
+    ))
+
+
+def notify_inbox_read(user_id, room_name, peer_username=None):
+    """Send read message notice to inbox sockets of the user.
+
+    Args:
+        user_id: id of the user who read message;
+        room_name: name of the room;
+        peer_username: name of the other member of direct room.
+    """
+    event = {'type': 'inbox_read', 'room': room_name}
+    if peer_username is not None:
+        event['peer'] = peer_username
+    async_to_sync(get_channel_layer().group_send)(get_inbox_group_name(user_id), event)
+
+
+def record_message(message):
+    """Update inbox entries of room members with the new message.
+
+    Args:
+        message: created message.
+    """
+    entries = InboxEntry.objects.filter(room_id=message.room_id)
+    summary = {
+        'last_message_id': message.id,
+        'preview': message.text[:INBOX_PREVIEW_LENGTH],
+        'last_activity': message.timestamp,
+    }
+    entries.exclude(user_id=message.user_id).update(unread_count=F('unread_count') + 1, **summary)
+    entries.filter(user_id=message.user_id).update(**summary)
+
+
+def record_read(message, user_ids):
+    """Decrease unread counts of users who read the message.
+
+    Args:
+        message: read message;
+        user_ids: ids of users who read it.
+    """
+    InboxEntry.objects.filter(
+        room_id=message.room_id,
+        user_id__in=set(user_ids) - {message.user_id},
+        unread_count__gt=0,
+    ).update(unread_count=F('unread_count') - 1)
+
+
+def build_room_entries(room, user_ids):
+    """Build inbox entries of room members with their unread counts.
+
+    Messages read by every member are counted with one grouped query.
+
+    Args:
+        room: room of the entries;
+        user_ids: ids of the members.
+
+    Returns:
+        list of unsaved inbox entries.
+    """
+    room_messages = Message.objects.filter(room=room)
+    last_message = room_messages.order_by('-id').first()
+    read_counts = {}
+    if last_message is not None:
+        messages_count = room_messages.count()
+        read_counts = dict(
+            Message.read_users.through.objects.filter(message__room=room, user_id__in=user_ids)
+            .values('user_id').annotate(read_count=Count('id')).values_list('user_id', 'read_count'),
+        )
+    participants = []
+    if room.type == RoomType.direct_messages:
+        participants = list(room.participant.values_list('id', flat=True))
+    entries = []
+    for user_id in user_ids:
+        peers = [participant for participant in participants if participant != user_id]
+        entry = InboxEntry(
+            user_id=user_id,
+            room=room,
+            room_type=room.type,
+            peer_id=peers[0] if peers else None,
+            last_activity=timezone.now(),
+        )
+        if last_message is not None:
+            entry.last_message_id = last_message.id
+            entry.preview = last_message.text[:INBOX_PREVIEW_LENGTH]
+            entry.last_activity = last_message.timestamp
+            entry.unread_count = messages_count - read_counts.get(user_id, 0)
+        entries.append(entry)
+    return entries
+
+
+def add_room_members(room, user_ids):
+    """Create inbox entries for new members of the room.
+
+    Args:
+        room: room members are added to;
+        user_ids: ids of added users.
+    """
+    InboxEntry.objects.bulk_create(build_room_entries(room, user_ids), ignore_conflicts=True)
+
+
+def remove_room_members(room, user_ids=None):
+    """Delete inbox entries of users who left the room.
+
+    Args:
+        room: room members are removed from;
+        user_ids: ids of removed users, None for all members.
+    """
+    entries = InboxEntry.objects.filter(room=room)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    entries.delete()
+
+
+def rebuild_room_inbox(room):
+    """Recalculate inbox entries of all members of the room.
+
+    Entries are updated in place under row locks, so messages saved
+    meanwhile are either counted here or added by record_message after it.
+
+    Args:
+        room: room to recalculate.
+    """
+    with transaction.atomic():
+        list(InboxEntry.objects.select_for_update().filter(room=room).values_list('id', flat=True))
+        member_ids = list(room.participant.values_list('id', flat=True))
+        InboxEntry.objects.filter(room=room).exclude(user_id__in=member_ids).delete()
+        InboxEntry.objects.bulk_create(
+            build_room_entries(room, member_ids),
+            update_conflicts=True,
+            unique_fields=['user', 'room'],
+            update_fields=['room_type', 'peer', 'last_message_id', 'preview', 'last_activity', 'unread_count'],
+        )
+
+
+def encode_cursor(entry):
+    """Encode position of the entry for keyset pagination.
+
+    Args:
+        entry: last entry of the page.
+
+    Returns:
+        cursor string.
+    """
+    microseconds = (entry.last_activity - EPOCH) // timedelta(microseconds=1)
+    return f'{microseconds}_{entry.id}'
+
+
+def get_inbox_page(entries, cursor, page_size):
+    """Get page of inbox entries ordered by last activity.
+
+    Args:
+        entries: queryset of inbox entries;
+        cursor: cursor of the previous page end, None for the first page;
+        page_size: number of entries per page.
+
+    Returns:
+        pair of entries list and cursor of the next page or None.
+    """
+    if cursor:
+        try:
+            microseconds, entry_id = (int(part) for part in cursor.split('_'))
+            last_activity = EPOCH + timedelta(microseconds=microseconds)
+        except (ValueError, OverflowError):
+            last_activity = None
+        # Invalid cursors, including ids out of the column range, show the first page.
+        if last_activity is not None and 0 < entry_id <= MAX_ENTRY_ID:
+            entries = entries.filter(
+                Q(last_activity__lt=last_activity) | Q(last_activity=last_activity, id__lt=entry_id),
+            )
+    page = list(entries.order_by('-last_activity', '-id')[:page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
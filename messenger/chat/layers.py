@@ -0,0 +1,105 @@
+"""Module with channel layer selection for chat rooms."""
+
+from channels.layers import DEFAULT_CHANNEL_LAYER
+from django.conf import settings
+
+from messenger.chat.models import Room
+
+# Pins the layer unless another one is pinned and adds the user to online users in one
+# step, so the last leaver can't release the pin between them. Empty username adds nobody.
+PIN_LAYER_SCRIPT = """
+local pinned_alias = redis.call('get', KEYS[1])
+if not pinned_alias then
+    pinned_alias = ARGV[1]
+    redis.call('set', KEYS[1], pinned_alias)
+end
+if pinned_alias ~= ARGV[1] then
+    return pinned_alias
+end
+redis.call('expire', KEYS[1], ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('sadd', KEYS[2], ARGV[3])
+end
+return pinned_alias
+"""
+# Checks online users and deletes the pin in one step, a user joining between them keeps the pin.
+RELEASE_LAYER_SCRIPT = """
+if redis.call('scard', KEYS[1]) == 0 then
+    return redis.call('del', KEYS[2])
+end
+return 0
+"""
+
+
+def get_room_layer_key(room_name):
+    """Get redis key storing channel layer alias chosen for the room.
+
+    Args:
+        room_name: name of the chatroom.
+
+    Returns:
+        redis key name.
+    """
+    return f'{room_name}_layer'
+
+
+def choose_room_layer_alias(room_name):
+    """Choose channel layer alias for the room by its members count.
+
+    Rooms with at least LARGE_ROOM_MEMBERS_THRESHOLD members are served by
+    the pub/sub layer, where fan-out happens in each worker and groups are
+    sharded across several redis instances. The choice is pinned in redis by
+    pin_room_layer_alias while anybody is online in the room, so all
+    consumers of the room stay on the same layer even if the members count
+    crosses the threshold.
+
+    Args:
+        room_name: name of the chatroom.
+
+    Returns:
+        alias of the channel layer to use for the room.
+    """
+    pinned_alias = settings.REDIS_CLIENT.get(get_room_layer_key(room_name))
+    if pinned_alias is not None:
+        return pinned_alias.decode('utf-8')
+
+    large_room_alias = settings.LARGE_ROOM_CHANNEL_LAYER
+    if large_room_alias in settings.CHANNEL_LAYERS:
+        members_count = Room.objects.filter(name=room_name).values_list('members_count', flat=True).first()
+        if members_count is not None and members_count >= settings.LARGE_ROOM_MEMBERS_THRESHOLD:
+            return large_room_alias
+    return DEFAULT_CHANNEL_LAYER
+
+
+def pin_room_layer_alias(room_name, alias, username=''):
+    """Pin channel layer of existing room and add the user to its online users.
+
+    The pin expires after ROOM_LAYER_PIN_TTL, every join extends it.
+
+    Args:
+        room_name: name of the chatroom;
+        alias: alias of the channel layer chosen for the room;
+        username: name of the joining user, empty to leave online users to the room owner.
+
+    Returns:
+        alias pinned for the room, the user isn't added if it differs from the given one.
+    """
+    pinned_alias = settings.REDIS_CLIENT.eval(
+        PIN_LAYER_SCRIPT,
+        2,
+        get_room_layer_key(room_name),
+        f'{room_name}_onlines',
+        bytes(alias, 'utf-8'),
+        settings.ROOM_LAYER_PIN_TTL,
+        bytes(username, 'utf-8'),
+    )
+    return pinned_alias.decode('utf-8')
+
+
+def release_room_layer_alias(room_name):
+    """Unpin channel layer of the room if nobody is online there.
+
+    Args:
+        room_name: name of the chatroom.
+    """
+    settings.REDIS_CLIENT.eval(RELEASE_LAYER_SCRIPT, 2, f'{room_name}_onlines', get_room_layer_key(room_name))
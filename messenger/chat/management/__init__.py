@@ -0,0 +1 @@
+"""Package with management utilities for chat app."""
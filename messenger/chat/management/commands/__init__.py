@@ -0,0 +1 @@
+"""Package with management commands for chat app."""
@@ -0,0 +1,62 @@
+"""Module with command moving old messages to cold storage archive."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from messenger.chat.archive import archive_room, get_room_archive_dir, verify_room_archive
+from messenger.chat.inbox import rebuild_room_inbox
+from messenger.chat.models import Room
+from messenger.chat.versions import ROOMS_VERSION_KEY, bump_versions, get_room_version_key, get_user_version_key
+
+
+class Command(BaseCommand):
+    """Archive messages older than retention period and verify archives."""
+
+    help = 'Move messages older than retention period to compressed archive segments.'
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--room', help='Name of the only room to process.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages per archive segment.')
+        parser.add_argument('--verify', action='store_true', help='Only verify existing archives.')
+
+    def handle(self, *args, **options):
+        """Archive or verify messages of rooms.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+
+        Raises:
+            CommandError: if verification finds problems.
+        """
+        rooms = Room.objects.all()
+        if options['room']:
+            rooms = rooms.filter(name=options['room'])
+        if options['verify']:
+            failed = False
+            for room in rooms:
+                if not get_room_archive_dir(room.id).exists():
+                    continue
+                for error in verify_room_archive(room.id):
+                    failed = True
+                    self.stderr.write(f'{room.name}: {error}')
+            if failed:
+                raise CommandError('Archive verification failed.')
+            self.stdout.write(self.style.SUCCESS('Archives are consistent.'))
+            return
+        for room in rooms:
+            archived = archive_room(room, options['batch_size'])
+            if archived:
+                # Archived messages stop counting as unread on list pages.
+                rebuild_room_inbox(room)
+                participants = room.participant.values_list('id', flat=True)
+                bump_versions(
+                    get_room_version_key(room.name),
+                    ROOMS_VERSION_KEY,
+                    *[get_user_version_key(user_id) for user_id in participants],
+                )
+                self.stdout.write(f'{room.name}: {archived} messages archived')
@@ -0,0 +1,168 @@
+"""Module with benchmark of group fan-out latency for channel layers."""
+
+import asyncio
+import shutil
+import statistics
+import subprocess
+import time
+
+from channels_redis.core import RedisChannelLayer
+from channels_redis.pubsub import RedisPubSubChannelLayer
+from django.core.management.base import BaseCommand, CommandError
+
+BENCH_PREFIX = 'bench_fanout'
+BENCH_GROUP = 'chat_bench_fanout'
+REDIS_START_TIMEOUT = 5
+
+
+def start_redis_servers(base_port, shards):
+    """Start local redis-server processes without persistence.
+
+    Args:
+        base_port: port of the first redis process;
+        shards: number of redis processes to start.
+
+    Returns:
+        list of started processes.
+
+    Raises:
+        CommandError: if redis-server executable is not found.
+    """
+    executable = shutil.which('redis-server')
+    if executable is None:
+        raise CommandError('redis-server executable is required for --spawn.')
+    return [
+        subprocess.Popen(
+            [executable, '--port', str(base_port + shard), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL,
+        )
+        for shard in range(shards)
+    ]
+
+
+async def wait_redis_servers(hosts):
+    """Wait until local redis processes accept connections.
+
+    Args:
+        hosts: list of (host, port) pairs.
+
+    Raises:
+        CommandError: if redis doesn't start in time.
+    """
+    deadline = time.monotonic() + REDIS_START_TIMEOUT
+    for host, port in hosts:
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'redis on {host}:{port} did not start.')
+                await asyncio.sleep(0.05)
+                continue
+            writer.close()
+            await writer.wait_closed()
+            break
+
+
+async def measure_fanout(layers, members, messages):
+    """Measure latency of delivering group messages to every member.
+
+    Members are spread evenly over layers, each layer instance stands for
+    a separate worker process.
+
+    Args:
+        layers: channel layer instances, one per simulated worker;
+        members: number of group members;
+        messages: number of group messages to send.
+
+    Returns:
+        list of fan-out latencies in seconds.
+    """
+    members_channels = []
+    for index in range(members):
+        layer = layers[index % len(layers)]
+        channel = await layer.new_channel()
+        await layer.group_add(BENCH_GROUP, channel)
+        members_channels.append((layer, channel))
+
+    latencies = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        await layers[0].group_send(BENCH_GROUP, {'type': 'chat_message', 'messages': []})
+        await asyncio.gather(*(layer.receive(channel) for layer, channel in members_channels))
+        latencies.append(time.perf_counter() - started)
+
+    for layer, channel in members_channels:
+        await layer.group_discard(BENCH_GROUP, channel)
+    for layer in layers:
+        await layer.flush()
+    return latencies
+
+
+class Command(BaseCommand):
+    """Compare group fan-out latency of the current and the large-room layers."""
+
+    help = 'Benchmark group fan-out latency of RedisChannelLayer against sharded RedisPubSubChannelLayer.'
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--members', type=int, default=1000, help='Number of group members.')
+        parser.add_argument('--workers', type=int, default=4, help='Number of simulated workers.')
+        parser.add_argument('--messages', type=int, default=50, help='Number of group messages to send.')
+        parser.add_argument('--shards', type=int, default=2, help='Number of redis instances for pub/sub layer.')
+        parser.add_argument('--port', type=int, default=6390, help='Port of the first local redis instance.')
+        parser.add_argument('--spawn', action='store_true', help='Start local redis-server processes.')
+
+    def handle(self, *args, **options):
+        """Run benchmark.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+        """
+        hosts = [('127.0.0.1', options['port'] + shard) for shard in range(options['shards'])]
+        processes = start_redis_servers(options['port'], options['shards']) if options['spawn'] else []
+        try:
+            asyncio.run(wait_redis_servers(hosts))
+            results = asyncio.run(self.run_layers(hosts, options))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+        for layer_name, latencies in results.items():
+            latencies_ms = sorted(latency * 1000 for latency in latencies)
+            p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1] if len(latencies_ms) > 1 else latencies_ms[0]
+            self.stdout.write(
+                f'{layer_name}: members={options["members"]} workers={options["workers"]} '
+                f'median={statistics.median(latencies_ms):.2f}ms p95={p95:.2f}ms max={latencies_ms[-1]:.2f}ms',
+            )
+
+    async def run_layers(self, hosts, options):
+        """Measure both layers one after another.
+
+        Args:
+            hosts: list of (host, port) pairs of redis instances;
+            options: command options.
+
+        Returns:
+            dictionary with latencies by layer name.
+        """
+        layers = {
+            'RedisChannelLayer': [
+                RedisChannelLayer(hosts=hosts[:1], prefix=BENCH_PREFIX, capacity=options['messages'])
+                for _ in range(options['workers'])
+            ],
+            'RedisPubSubChannelLayer': [
+                RedisPubSubChannelLayer(hosts=hosts, prefix=BENCH_PREFIX)
+                for _ in range(options['workers'])
+            ],
+        }
+        return {
+            layer_name: await measure_fanout(workers_layers, options['members'], options['messages'])
+            for layer_name, workers_layers in layers.items()
+        }
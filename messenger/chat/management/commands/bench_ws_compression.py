@@ -0,0 +1,173 @@
+"""Module with benchmark of websocket compression for chat frames."""
+
+import json
+import random
+import time
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from messenger.chat.consumers import MESSAGES_PAGINATE
+from messenger.chat.models import Message, Room
+
+# Tail which permessage-deflate strips from every compressed message.
+DEFLATE_TAIL_SIZE = 4
+SAMPLE_PAGES = 10
+SAMPLE_WORDS = (
+    'привет', 'как', 'дела', 'сегодня', 'встреча', 'в', 'офисе', 'hello', 'deploy', 'is', 'done',
+    'please', 'check', 'the', 'logs', 'завтра', 'созвон', 'ok', 'спасибо', 'bug', 'fixed', 'room',
+)
+
+
+def build_message_data(message_id, username, text, timestamp):
+    """Build message data the way ChatConsumer sends it.
+
+    Args:
+        message_id: id of the message;
+        username: author of the message;
+        text: text of the message;
+        timestamp: time message was created.
+
+    Returns:
+        dictionary with message data.
+    """
+    return {
+        'message_id': message_id,
+        'message': text,
+        'user': username,
+        'time': datetime.strftime(timestamp, '%H:%M'),
+        'date': datetime.strftime(timestamp, '%d.%b.%Y'),
+        'read_message': True,
+    }
+
+
+def get_sample_messages(room_name, amount):
+    """Get messages data from the room or generate similar ones.
+
+    Args:
+        room_name: name of the room to take messages from, None to generate;
+        amount: number of messages.
+
+    Returns:
+        list of message data dictionaries.
+
+    Raises:
+        CommandError: if the room has no messages.
+    """
+    if room_name:
+        room = Room.objects.filter(name=room_name).first()
+        messages = list(Message.objects.filter(room=room).select_related('user').order_by('-id')[:amount])
+        if not messages:
+            raise CommandError('Room has no messages.')
+        return [
+            build_message_data(message.id, message.user.username, message.text, message.timestamp)
+            for message in messages
+        ]
+    randomizer = random.Random(0)
+    usernames = [f'user{number}' for number in range(10)]
+    return [
+        build_message_data(
+            100000 + number,
+            randomizer.choice(usernames),
+            ' '.join(randomizer.choices(SAMPLE_WORDS, k=randomizer.randint(2, 25))),
+            datetime.now(),
+        )
+        for number in range(amount)
+    ]
+
+
+def build_frames(messages, frames_count):
+    """Build typical ChatConsumer frames.
+
+    Args:
+        messages: message data dictionaries;
+        frames_count: number of frames of every kind.
+
+    Returns:
+        dictionary with lists of encoded frames by frame kind.
+    """
+    pages = [
+        messages[start:start + MESSAGES_PAGINATE]
+        for start in range(0, len(messages), MESSAGES_PAGINATE)
+    ]
+    return {
+        'history': [
+            json.dumps({'type': 'paginate_up', 'messages': pages[number % len(pages)]}).encode('utf8')
+            for number in range(frames_count)
+        ],
+        'chat_message': [
+            json.dumps({'type': 'chat_message', 'messages': [messages[number % len(messages)]]}).encode('utf8')
+            for number in range(frames_count)
+        ],
+        'user_typing': [
+            json.dumps({'type': 'user_typing', 'user': 'user1', 'message': 'user1 печатает...'}).encode('utf8')
+            for _ in range(frames_count)
+        ],
+        'online_users': [
+            json.dumps({'type': 'online_users', 'users': [f'user{number}' for number in range(30)]}).encode('utf8')
+            for _ in range(frames_count)
+        ],
+    }
+
+
+def deflate_frames(frames, context_takeover, level):
+    """Compress frames the way permessage-deflate does.
+
+    Args:
+        frames: encoded frames sent over one connection;
+        context_takeover: True to keep compression context between frames;
+        level: zlib compression level.
+
+    Returns:
+        pair of compressed sizes list and seconds spent.
+    """
+    sizes = []
+    compressor = None
+    started = time.perf_counter()
+    for frame in frames:
+        if compressor is None or not context_takeover:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        compressed = compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        sizes.append(len(compressed) - DEFLATE_TAIL_SIZE)
+    return sizes, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    """Compare CPU cost and saved bytes of compressing ChatConsumer frames."""
+
+    help = 'Benchmark permessage-deflate on typical ChatConsumer payloads.'
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--room', help='Take messages from this room instead of generated ones.')
+        parser.add_argument('--frames', type=int, default=200, help='Frames of every kind per connection.')
+        parser.add_argument('--level', type=int, default=zlib.Z_DEFAULT_COMPRESSION, help='zlib level.')
+
+    def handle(self, *args, **options):
+        """Run benchmark.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+        """
+        messages = get_sample_messages(options['room'], MESSAGES_PAGINATE * SAMPLE_PAGES)
+        threshold = settings.WEBSOCKET_COMPRESSION_MIN_SIZE
+        self.stdout.write(f'compression threshold: {threshold} bytes')
+        for kind, frames in build_frames(messages, options['frames']).items():
+            raw_size = sum(len(frame) for frame in frames)
+            compressed_flag = 'compressed' if len(frames[0]) >= threshold else 'skipped'
+            for context_takeover in (False, True):
+                sizes, seconds = deflate_frames(frames, context_takeover, options['level'])
+                compressed_size = sum(sizes)
+                self.stdout.write(
+                    f'{kind:<13} {compressed_flag:<10} context_takeover={context_takeover!s:<5} '
+                    f'frame={len(frames[0])}B -> {compressed_size / len(frames):.0f}B '
+                    f'saved={100 - compressed_size * 100 / raw_size:.1f}% '
+                    f'cpu={seconds * 1000000 / len(frames):.1f}us/frame',
+                )
@@ -0,0 +1,337 @@
+"""Module with command checking plans of hot chat queries."""
+
+import json
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.utils import timezone
+
+from messenger.chat.consumers import ChatConsumer
+from messenger.chat.inbox import get_inbox_page
+from messenger.chat.models import InboxEntry, Message, Room, RoomType
+from messenger.chat.participants import PARTICIPANTS_PAGE_SIZE, get_offline_members
+from messenger.chat.views import INBOX_PAGE_SIZE, DirectListView, RoomDetailView, RoomListView
+
+User = get_user_model()
+
+# Tables growing with usage, a full scan of them is a regression.
+HOT_TABLES = frozenset((
+    Message._meta.db_table,
+    Message.read_users.through._meta.db_table,
+    Room._meta.db_table,
+    Room.participant.through._meta.db_table,
+    InboxEntry._meta.db_table,
+))
+# Planners rightly scan smaller tables fully.
+FULL_SCAN_MIN_ROWS = 1000
+SEED_USERS = 2000
+SEED_ROOMS = 1000
+SEED_ROOM_MEMBERS = 20
+SEED_BATCH_SIZE = 5000
+# Share of hot room messages read by the checked user, the rest are unread.
+SEED_READ_SHARE = 0.9
+SQLITE_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+SQLITE_INDEX_PATTERN = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+
+def seed_database(messages_count):
+    """Fill database with synthetic users, rooms, messages and inbox entries.
+
+    Half of the messages go to one common room, all rooms have the first
+    user as member.
+
+    Args:
+        messages_count: number of messages to create.
+
+    Returns:
+        pair of the busiest room and its member to check queries for.
+    """
+    rng = random.Random(0)
+    users = User.objects.bulk_create(
+        [User(username=f'plan_check_{index}', password='!') for index in range(SEED_USERS)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    common_rooms = Room.objects.bulk_create(
+        [Room(name=f'plan_check_room_{index}', type=RoomType.common_channel) for index in range(SEED_ROOMS)],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    direct_rooms = Room.objects.bulk_create(
+        [
+            Room(name=f'__{users[0].username}_{user.username}_direct__', type=RoomType.direct_messages)
+            for user in users[1:SEED_ROOMS + 1]
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    members = {room: [users[0], *rng.sample(users[1:], SEED_ROOM_MEMBERS - 1)] for room in common_rooms}
+    members.update((room, [users[0], user]) for room, user in zip(direct_rooms, users[1:]))
+    Room.participant.through.objects.bulk_create(
+        [
+            Room.participant.through(room_id=room.id, user_id=user.id)
+            for room, room_members in members.items()
+            for user in room_members
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    now = timezone.now()
+    InboxEntry.objects.bulk_create(
+        [
+            InboxEntry(
+                user=user,
+                room=room,
+                room_type=room.type,
+                peer=room_members[1] if room.type == RoomType.direct_messages and user == users[0] else None,
+                last_activity=now - timedelta(seconds=rng.randrange(10 ** 6)),
+            )
+            for room, room_members in members.items()
+            for user in room_members
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+    hot_room = common_rooms[0]
+    rooms = list(members)
+    message_rooms = [hot_room if index % 2 else rng.choice(rooms) for index in range(messages_count)]
+    messages = Message.objects.bulk_create(
+        [Message(user=rng.choice(members[room]), room=room, text='plan check') for room in message_rooms],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    hot_messages_read = int(messages_count / 2 * SEED_READ_SHARE)
+    reads = []
+    for message in messages:
+        readers = {message.user_id, *(user.id for user in rng.sample(members[message.room], 2))}
+        if message.room == hot_room and hot_messages_read > 0:
+            readers.add(users[0].id)
+            hot_messages_read -= 1
+        reads.extend(Message.read_users.through(message_id=message.id, user_id=user_id) for user_id in readers)
+    Message.read_users.through.objects.bulk_create(reads, batch_size=SEED_BATCH_SIZE)
+    return hot_room, users[0]
+
+
+def analyze_tables():
+    """Refresh planner statistics of hot tables."""
+    with connection.cursor() as cursor:
+        for table in sorted(HOT_TABLES | {User._meta.db_table}):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+
+def get_large_tables():
+    """Get hot tables too big to be scanned fully.
+
+    Returns:
+        set of table names.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT relname, reltuples FROM pg_class WHERE relname = ANY(%s)', [list(HOT_TABLES)])
+            rows = dict(cursor.fetchall())
+        else:
+            rows = {}
+            for table in HOT_TABLES:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                rows[table] = cursor.fetchone()[0]
+    return {table for table, count in rows.items() if count >= FULL_SCAN_MIN_ROWS}
+
+
+def get_scanned_tables(sql, params):
+    """Get tables the query plan scans fully.
+
+    Args:
+        sql: query;
+        params: query parameters.
+
+    Returns:
+        set of table names.
+    """
+    tables = set()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            nodes = [(json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    tables.add(node['Relation Name'])
+                nodes.extend(node.get('Plans', []))
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            for row in cursor.fetchall():
+                match = SQLITE_SCAN_PATTERN.match(row[-1])
+                if match:
+                    tables.add(match.group(1))
+    return tables
+
+
+def get_used_indexes(sql, params):
+    """Get indexes the query plan reads.
+
+    Args:
+        sql: query;
+        params: query parameters.
+
+    Returns:
+        set of index names.
+    """
+    indexes = set()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            nodes = [(json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                if 'Index Name' in node:
+                    indexes.add(node['Index Name'])
+                nodes.extend(node.get('Plans', []))
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            for row in cursor.fetchall():
+                match = SQLITE_INDEX_PATTERN.search(row[-1])
+                if match:
+                    indexes.add(match.group(1))
+    return indexes
+
+
+def capture_queries(function):
+    """Run function, collecting SELECT queries it makes.
+
+    Args:
+        function: function to run.
+
+    Returns:
+        dictionary with parameters of the first run by distinct query.
+    """
+    queries = {}
+
+    def capture(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            queries.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        function()
+    return queries
+
+
+def get_hot_queries(room, user):
+    """Get functions running hot queries of chat consumer and views.
+
+    Args:
+        room: room to run queries for;
+        user: member of the room.
+
+    Returns:
+        dictionary with functions by query name, in order to run.
+    """
+    request = RequestFactory().get('/')
+    request.user = user
+    consumer = ChatConsumer()
+    consumer.scope = {'user': user}
+    consumer.room = room
+    consumer.room_name = room.name
+
+    def get_view(view_class, **kwargs):
+        view = view_class()
+        view.setup(request, **kwargs)
+        return view
+
+    return {
+        'room detail': lambda: get_view(RoomDetailView, room_name=room.name).check_page_access(),
+        'room list version': lambda: get_view(RoomListView).get_last_inbox_activity(),
+        'room list': lambda: get_inbox_page(get_view(RoomListView).get_inbox_entries(), None, INBOX_PAGE_SIZE),
+        'direct list': lambda: get_inbox_page(get_view(DirectListView).get_inbox_entries(), None, INBOX_PAGE_SIZE),
+        'chat start messages': lambda: consumer.get_start_messages(room.name),
+        'chat paginate down': lambda: consumer.get_paginate_down(page=1),
+        'chat paginate up': lambda: consumer.get_paginate_up(page=1),
+        'chat participants': lambda: get_offline_members(room, [], None, PARTICIPANTS_PAGE_SIZE),
+    }
+
+
+class Command(BaseCommand):
+    """Fail if a hot query plan scans a large table fully."""
+
+    help = (
+        'EXPLAIN queries of chat consumer and views, fail on full scans of large tables. '
+        'With --seed synthetic data is created and rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--seed', type=int, default=0, help='Number of synthetic messages to create.')
+        parser.add_argument('--room', help='Name of the room to check, the one with the latest message by default.')
+
+    def handle(self, *args, **options):
+        """Check query plans.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+
+        Raises:
+            CommandError: if database is unsupported, empty or a query scans large table.
+        """
+        if connection.vendor not in {'postgresql', 'sqlite'}:
+            raise CommandError(f'Query plans of {connection.vendor} are not supported.')
+        with transaction.atomic():
+            if options['seed']:
+                room, user = seed_database(options['seed'])
+                analyze_tables()
+            else:
+                room, user = self.get_checked_room(options['room'])
+            failures = self.check_plans(room, user)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f'Full scans in hot queries: {", ".join(failures)}.')
+
+    def get_checked_room(self, room_name):
+        """Get existing room and its member to check queries for.
+
+        Args:
+            room_name: name of the room, None for the room with the latest message.
+
+        Returns:
+            pair of room and user.
+
+        Raises:
+            CommandError: if there is no such room or member.
+        """
+        rooms = Room.objects.filter(name=room_name) if room_name else Room.objects.filter(
+            id__in=Message.objects.order_by('-id').values('room_id')[:1],
+        )
+        room = rooms.first()
+        user = room.participant.first() if room is not None else None
+        if user is None:
+            raise CommandError('No room with members to check, use --seed.')
+        return room, user
+
+    def check_plans(self, room, user):
+        """Explain hot queries and report full scans of large tables.
+
+        Args:
+            room: room to run queries for;
+            user: member of the room.
+
+        Returns:
+            names of queries with full scans.
+        """
+        large_tables = get_large_tables()
+        failures = []
+        for name, function in get_hot_queries(room, user).items():
+            scanned_tables = set()
+            for sql, params in capture_queries(function).items():
+                scanned_tables |= get_scanned_tables(sql, params) & large_tables
+            if scanned_tables:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: full scan of {", ".join(sorted(scanned_tables))}'))
+            else:
+                self.stdout.write(f'{name}: ok')
+        return failures
@@ -0,0 +1,139 @@
+"""Module with command purging soft deleted rooms in bounded batches."""
+
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messenger.chat.archive import get_room_archive_dir
+from messenger.chat.models import InboxEntry, Message, Room
+
+ReadUsers = Message.read_users.through
+Participants = Room.participant.through
+
+
+def get_purge_progress_key(room_id):
+    """Get redis key storing purge progress of the room.
+
+    Args:
+        room_id: id of the deleted room.
+
+    Returns:
+        redis key name.
+    """
+    return f'{room_id}_purge'
+
+
+def delete_batch(queryset, batch_size):
+    """Delete one batch of rows in its own transaction.
+
+    Args:
+        queryset: rows to delete, ordered by primary key;
+        batch_size: maximum number of rows to delete.
+
+    Returns:
+        number of deleted rows.
+    """
+    with transaction.atomic():
+        batch_ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch_ids:
+            return 0
+        queryset.model.objects.filter(pk__in=batch_ids).delete()
+    return len(batch_ids)
+
+
+class Command(BaseCommand):
+    """Purge messages, read marks, inbox entries and members of soft deleted rooms."""
+
+    help = 'Delete soft deleted rooms in bounded batches, safe to stop and run again.'
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows to delete per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches.')
+        parser.add_argument('--loop', action='store_true', help='Keep waiting for new deleted rooms.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between checks with --loop.')
+        parser.add_argument('--status', action='store_true', help='Only report progress of pending purges.')
+
+    def handle(self, *args, **options):
+        """Purge deleted rooms.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+        """
+        if options['status']:
+            self.report_status()
+            return
+        while True:
+            for room in Room.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at'):
+                self.purge_room(room, options['batch_size'], options['sleep'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def report_status(self):
+        """Print progress of every pending purge."""
+        for room in Room.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at'):
+            progress = settings.REDIS_CLIENT.hgetall(get_purge_progress_key(room.id))
+            progress = {field.decode('utf-8'): int(value) for field, value in progress.items()}
+            self.stdout.write(
+                f'room {room.id} deleted at {room.deleted_at:%Y-%m-%d %H:%M}: '
+                f'read marks {progress.get("read_marks", 0)}, messages {progress.get("messages", 0)}, '
+                f'inbox entries {progress.get("inbox_entries", 0)}, members {progress.get("members", 0)} purged',
+            )
+
+    def purge_room(self, room, batch_size, sleep):
+        """Delete rows of the room batch by batch.
+
+        Every batch is committed separately and the remaining rows are
+        selected again, so after a crash the purge continues from where it
+        stopped. Read marks go first, so no single batch of messages
+        cascades over an unbounded number of read rows.
+
+        Args:
+            room: soft deleted room;
+            batch_size: maximum number of rows deleted per transaction;
+            sleep: pause between batches in seconds.
+        """
+        # Read marks are found through pages of the room messages, their table has no room column.
+        message_ids = Message.objects.filter(room_id=room.id).order_by('id').values_list('id', flat=True)
+        last_message_id = 0
+        while True:
+            batch_message_ids = list(message_ids.filter(id__gt=last_message_id)[:batch_size])
+            if not batch_message_ids:
+                break
+            last_message_id = batch_message_ids[-1]
+            read_marks = ReadUsers.objects.filter(message_id__in=batch_message_ids)
+            self.purge_stage(room, 'read_marks', read_marks, batch_size, sleep)
+        self.purge_stage(room, 'messages', Message.objects.filter(room_id=room.id), batch_size, sleep)
+        self.purge_stage(room, 'inbox_entries', InboxEntry.objects.filter(room_id=room.id), batch_size, sleep)
+        self.purge_stage(room, 'members', Participants.objects.filter(room_id=room.id), batch_size, sleep)
+        shutil.rmtree(get_room_archive_dir(room.id), ignore_errors=True)
+        Room.all_objects.filter(pk=room.pk).delete()
+        settings.REDIS_CLIENT.delete(get_purge_progress_key(room.id))
+        self.stdout.write(self.style.SUCCESS(f'room {room.id} purged'))
+
+    def purge_stage(self, room, stage, queryset, batch_size, sleep):
+        """Delete rows of one stage of the room purge batch by batch.
+
+        Args:
+            room: soft deleted room;
+            stage: name of the stage in purge progress;
+            queryset: rows to delete;
+            batch_size: maximum number of rows deleted per transaction;
+            sleep: pause between batches in seconds.
+        """
+        while True:
+            deleted = delete_batch(queryset, batch_size)
+            if not deleted:
+                return
+            purged = settings.REDIS_CLIENT.hincrby(get_purge_progress_key(room.id), stage, deleted)
+            self.stdout.write(f'room {room.id}: {purged} {stage} purged')
+            time.sleep(sleep)
@@ -0,0 +1,34 @@
+"""Module with command recalculating inbox summaries."""
+
+from django.core.management.base import BaseCommand
+
+from messenger.chat.inbox import rebuild_room_inbox
+from messenger.chat.models import Room
+
+
+class Command(BaseCommand):
+    """Recalculate inbox summaries of all room members."""
+
+    help = 'Fill inbox summaries from rooms and messages, run after migration or to repair counts.'
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--room', help='Name of the only room to process.')
+
+    def handle(self, *args, **options):
+        """Rebuild inbox summaries.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+        """
+        rooms = Room.objects.all()
+        if options['room']:
+            rooms = rooms.filter(name=options['room'])
+        for room in rooms.iterator():
+            rebuild_room_inbox(room)
+            self.stdout.write(f'{room.name}: inbox rebuilt')
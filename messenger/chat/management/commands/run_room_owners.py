@@ -0,0 +1,42 @@
+"""Module with command running room owners of room actors mode."""
+
+from channels.layers import DEFAULT_CHANNEL_LAYER
+from channels.management.commands.runworker import Command as RunWorkerCommand
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+class Command(RunWorkerCommand):
+    """Run worker serving room owner channels."""
+
+    help = (
+        'Serve room owner channels, all of them by default. '
+        'Every channel must be served by exactly one running process.'
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments.
+
+        Args:
+            parser: command arguments parser.
+        """
+        parser.add_argument('--layer', default=DEFAULT_CHANNEL_LAYER, help='Channel layer alias to use.')
+        parser.add_argument(
+            'channels', nargs='*', help='Owner channels to serve, all of ROOM_OWNER_CHANNELS if omitted.',
+        )
+
+    def handle(self, *args, **options):
+        """Run room owners.
+
+        Args:
+            args: positional arguments;
+            options: command options.
+
+        Raises:
+            CommandError: if channel is not a room owner channel.
+        """
+        unknown_channels = set(options['channels']) - set(settings.ROOM_OWNER_CHANNELS)
+        if unknown_channels:
+            raise CommandError(f'Not room owner channels: {", ".join(sorted(unknown_channels))}.')
+        options['channels'] = options['channels'] or settings.ROOM_OWNER_CHANNELS
+        super().handle(*args, **options)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_room_deleted_at_delete_onlineuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Days to keep messages before archiving, empty to use global policy, 0 to keep forever.', null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_members_count(apps, schema_editor):
+    """Fill number of participants of existing rooms.
+
+    Args:
+        apps: historical apps registry;
+        schema_editor: database schema editor.
+    """
+    Room = apps.get_model('chat', 'Room')
+    counts = Room.participant.through.objects.filter(
+        room_id=models.OuterRef('pk'),
+    ).order_by().values('room_id').annotate(total=models.Count('id')).values('total')
+    Room.objects.update(members_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_inboxentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_members_count, migrations.RunPython.noop),
+    ]
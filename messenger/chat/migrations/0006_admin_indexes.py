@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:15
+
+from django.db import migrations, models
+
+from messenger.chat.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('chat', '0005_room_members_count'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['timestamp'], name='chat_message_timestamp_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='room',
+            index=models.Index(fields=['members_count'], name='chat_room_members_count_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+from messenger.chat.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('chat', '0006_admin_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['room', 'id'], name='chat_message_room_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['room', '-timestamp'], name='chat_message_room_time_idx'),
+        ),
+    ]
@@ -1,11 +1,17 @@
 """Module with models for chat."""
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 User = get_user_model()
 
 ROOM_NAME_MAX_LENGTH = 128
+INBOX_PREVIEW_LENGTH = 64
+# Deleted rooms are renamed to their id with the suffix, freeing their names.
+DELETED_ROOM_SUFFIX = '__deleted__'
 
 
 class MessageManager(models.Manager):
@@ -35,10 +41,12 @@ def validate_room_name(value_to_validate):
         validated room name.
 
     Raises:
-        ValueError: if room name conflicts with urlpatterns.
+        ValidationError: if room name conflicts with urlpatterns or names of deleted rooms.
     """
     if value_to_validate in {'direct', 'create'}:
-        raise ValueError('You cannot create room named "create" or "direct".')
+        raise ValidationError('You cannot create room named "create" or "direct".')
+    if value_to_validate.endswith(DELETED_ROOM_SUFFIX):
+        raise ValidationError(f'Room name cannot end with "{DELETED_ROOM_SUFFIX}".')
     return value_to_validate
 
 
@@ -49,31 +57,94 @@ class RoomType(models.TextChoices):
     common_channel = 2, 'Common Channel'
 
 
+class RoomManager(models.Manager):
+    """Manager for Room model hiding deleted rooms."""
+
+    def get_queryset(self):
+        """Get queryset of rooms not deleted.
+
+        Returns:
+            queryset of rooms.
+        """
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Room(models.Model):
     """Model of room objects."""
 
     name = models.CharField(max_length=ROOM_NAME_MAX_LENGTH, unique=True, validators=[validate_room_name])
     participant = models.ManyToManyField(User, blank=False)
     type = models.CharField(max_length=2, choices=RoomType.choices)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    retention_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Days to keep messages before archiving, empty to use global policy, 0 to keep forever.',
+    )
+    members_count = models.PositiveIntegerField(default=0, editable=False)
 
-    @property
-    def members_count(self):
-        """Get number of participants of the room.
+    objects = RoomManager()
+    all_objects = models.Manager()
 
-        Returns:
-            Number of participants of the room.
+    class Meta:
+        """Metaclass for Room model."""
+
+        indexes = [
+            models.Index(fields=['members_count'], name='chat_room_members_count_idx'),
+        ]
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """Save the room, members_count is written only when update_fields names it.
+
+        The count is kept by refresh_members_count in the database, the value
+        in memory is stale after participants change.
+
+        Args:
+            force_insert: True to force SQL INSERT;
+            force_update: True to force SQL UPDATE;
+            using: database alias;
+            update_fields: names of fields to save, None for all but members_count.
+        """
+        if update_fields is None and not self._state.adding:
+            deferred_fields = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'members_count' and field.attname not in deferred_fields
+            ]
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
+    def soft_delete(self):
+        """Hide the room until its messages and inbox entries are purged in background.
+
+        Room name is freed, so room with the same name can be created again.
         """
-        return self.participant.count()
+        self.deleted_at = timezone.now()
+        self.name = f'{self.id}{DELETED_ROOM_SUFFIX}'
+        self.save(update_fields=['deleted_at', 'name'])
+
+    @classmethod
+    def refresh_members_count(cls, room_ids):
+        """Recalculate denormalized number of participants of rooms.
+
+        Args:
+            room_ids: ids of rooms to recalculate.
+        """
+        counts = cls.participant.through.objects.filter(
+            room_id=models.OuterRef('pk'),
+        ).order_by().values('room_id').annotate(total=models.Count('id')).values('total')
+        cls.all_objects.filter(id__in=room_ids).update(
+            members_count=Coalesce(models.Subquery(counts), 0),
+        )
 
     def __str__(self):
         """Return string representation of the Room model.
 
         Returns:
-            Room name and number of users online.
+            Room name and number of participants.
         """
         if self.type == RoomType.direct_messages:
-            participants = [part.username for part in self.participant]
-            return f'Direct: {" ".join.participants}'
+            participants = self.name.removeprefix('__').removesuffix('_direct__')
+            return f'Direct: {participants}'
         return f'{self.name} ({self.members_count})'
 
 
@@ -92,6 +163,11 @@ class Message(models.Model):
         """Metaclass for Message model."""
 
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='chat_message_timestamp_idx'),
+            models.Index(fields=['room', 'id'], name='chat_message_room_id_idx'),
+            models.Index(fields=['room', '-timestamp'], name='chat_message_room_time_idx'),
+        ]
 
     def __str__(self):
         """Return string representation of the Message model.
@@ -100,3 +176,34 @@ class Message(models.Model):
             Author of the message, its content and date created.
         """
         return f'{self.user.username}: {self.text} [{self.timestamp}]'
+
+
+class InboxEntry(models.Model):
+    """Model of room summary in the inbox of the user."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_entries')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='inbox_entries')
+    room_type = models.CharField(max_length=2, choices=RoomType.choices)
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    preview = models.CharField(max_length=INBOX_PREVIEW_LENGTH, blank=True)
+    last_activity = models.DateTimeField()
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Metaclass for InboxEntry model."""
+
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'room'], name='chat_inbox_user_room_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'room_type', '-last_activity', '-id'], name='chat_inbox_activity_idx'),
+        ]
+
+    def __str__(self):
+        """Return string representation of the InboxEntry model.
+
+        Returns:
+            Owner of the inbox, room name and unread count.
+        """
+        return f'{self.user_id}: {self.room_id} ({self.unread_count})'
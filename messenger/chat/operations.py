@@ -0,0 +1,39 @@
+"""Module with custom migration operations for chat app."""
+
+from django.db import migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Add index without locking writes on PostgreSQL, as usual elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        """Create the index.
+
+        Args:
+            app_label: label of the app;
+            schema_editor: database schema editor;
+            from_state: project state before the operation;
+            to_state: project state after the operation.
+        """
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        """Drop the index.
+
+        Args:
+            app_label: label of the app;
+            schema_editor: database schema editor;
+            from_state: project state before the operation;
+            to_state: project state after the operation.
+        """
+        if schema_editor.connection.vendor != 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
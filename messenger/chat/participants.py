@@ -0,0 +1,122 @@
+"""Module with cursor pagination of room participants, online members first.
+
+Online members come first ordered by username, then the rest ordered by id.
+Cursor is 'online:<username>' or 'offline:<id>' of the last served member.
+Presence changes between pages may move a member from one part to another,
+so such member can be skipped or served twice until the list is reloaded.
+"""
+
+from django.conf import settings
+
+PARTICIPANTS_PAGE_SIZE = 50
+ONLINE_CURSOR = 'online'
+OFFLINE_CURSOR = 'offline'
+
+
+def get_online_usernames(room_name):
+    """Get sorted usernames of users online in the room.
+
+    Args:
+        room_name: name of the room.
+
+    Returns:
+        list of usernames.
+    """
+    online_users = settings.REDIS_CLIENT.smembers(f'{room_name}_onlines')
+    return sorted(username.decode('utf-8') for username in online_users)
+
+
+def parse_cursor(cursor):
+    """Parse participants page cursor.
+
+    Args:
+        cursor: cursor of the previous page end, None for the first page.
+
+    Returns:
+        pair of list part and last served key, key is None for the part start.
+    """
+    part, _, key = (cursor or '').partition(':')
+    if part == OFFLINE_CURSOR and key.isdigit():
+        return OFFLINE_CURSOR, int(key)
+    if part == ONLINE_CURSOR and key:
+        return ONLINE_CURSOR, key
+    return ONLINE_CURSOR, None
+
+
+def get_online_members(room, usernames, after, limit):
+    """Get online members of the room after the username.
+
+    Args:
+        room: room to list;
+        usernames: sorted usernames of users online;
+        after: last served username, None to start from the beginning;
+        limit: maximum number of members.
+
+    Returns:
+        list of usernames of online members.
+    """
+    if after is not None:
+        usernames = [username for username in usernames if username > after]
+    members = []
+    for start in range(0, len(usernames), limit):
+        chunk = usernames[start:start + limit]
+        chunk_members = set(room.participant.filter(username__in=chunk).values_list('username', flat=True))
+        members.extend(username for username in chunk if username in chunk_members)
+        if len(members) >= limit:
+            break
+    return members[:limit]
+
+
+def get_offline_members(room, online_usernames, after, limit):
+    """Get members of the room who are not online, after the id.
+
+    Args:
+        room: room to list;
+        online_usernames: usernames of users online;
+        after: last served user id, None to start from the beginning;
+        limit: maximum number of members.
+
+    Returns:
+        list of id and username pairs.
+    """
+    online_usernames = set(online_usernames)
+    members = []
+    last_id = after or 0
+    while len(members) < limit:
+        batch = list(
+            room.participant.filter(id__gt=last_id).order_by('id').values_list('id', 'username')[:limit],
+        )
+        members.extend(member for member in batch if member[1] not in online_usernames)
+        if len(batch) < limit:
+            break
+        last_id = batch[-1][0]
+    return members[:limit]
+
+
+def get_participants_page(room, cursor, page_size=PARTICIPANTS_PAGE_SIZE):
+    """Get page of room participants, online members first.
+
+    Args:
+        room: room to list;
+        cursor: cursor of the previous page end, None for the first page;
+        page_size: number of participants per page.
+
+    Returns:
+        pair of participants list and cursor of the next page or None.
+    """
+    part, key = parse_cursor(cursor)
+    online_usernames = get_online_usernames(room.name)
+    participants = []
+    next_cursor = None
+    if part == ONLINE_CURSOR:
+        online_members = get_online_members(room, online_usernames, key, page_size)
+        participants = [{'user': username, 'online': True} for username in online_members]
+        if online_members:
+            next_cursor = f'{ONLINE_CURSOR}:{online_members[-1]}'
+        key = None
+    limit = page_size - len(participants)
+    if limit:
+        offline_members = get_offline_members(room, online_usernames, key, limit)
+        participants.extend({'user': username, 'online': False} for _, username in offline_members)
+        next_cursor = f'{OFFLINE_CURSOR}:{offline_members[-1][0]}' if len(offline_members) == limit else None
+    return participants, next_cursor
@@ -0,0 +1,108 @@
+"""Module with presence entries of users online in rooms and inboxes.
+
+Every process remembers entries its own sockets added, so a draining
+server can remove whatever its closed sockets didn't clean up.
+"""
+
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+# Hash with number of open inbox sockets by user id.
+INBOX_ONLINES_KEY = 'inbox_onlines'
+# Decreases socket count of the user, removing the user when no sockets are left.
+REMOVE_INBOX_ONLINE_SCRIPT = """
+if redis.call('hincrby', KEYS[1], ARGV[1], -tonumber(ARGV[2])) <= 0 then
+    redis.call('hdel', KEYS[1], ARGV[1])
+end
+"""
+
+local_entries = Counter()
+local_inbox_entries = Counter()
+local_entries_lock = threading.Lock()
+
+
+def track_online(room_name, username):
+    """Remember user added to online users of the room by a socket of this process.
+
+    Args:
+        room_name: name of the room;
+        username: name of the user.
+    """
+    with local_entries_lock:
+        local_entries[(room_name, username)] += 1
+
+
+def remove_online(room_name, username):
+    """Remove user from online users of the room.
+
+    Args:
+        room_name: name of the room;
+        username: name of the user.
+    """
+    with local_entries_lock:
+        local_entries[(room_name, username)] -= 1
+        if local_entries[(room_name, username)] <= 0:
+            del local_entries[(room_name, username)]
+    settings.REDIS_CLIENT.srem(f'{room_name}_onlines', bytes(username, 'utf-8'))
+
+
+def add_inbox_online(user_id):
+    """Count inbox socket of the user.
+
+    Args:
+        user_id: id of the user.
+    """
+    with local_entries_lock:
+        local_inbox_entries[user_id] += 1
+    settings.REDIS_CLIENT.hincrby(INBOX_ONLINES_KEY, user_id, 1)
+
+
+def remove_inbox_online(user_id):
+    """Uncount inbox socket of the user.
+
+    Args:
+        user_id: id of the user.
+    """
+    with local_entries_lock:
+        local_inbox_entries[user_id] -= 1
+        if local_inbox_entries[user_id] <= 0:
+            del local_inbox_entries[user_id]
+    settings.REDIS_CLIENT.eval(REMOVE_INBOX_ONLINE_SCRIPT, 1, INBOX_ONLINES_KEY, user_id, 1)
+
+
+def get_inbox_online_user_ids(user_ids):
+    """Get users with open inbox sockets in one lookup.
+
+    Args:
+        user_ids: ids of users to check.
+
+    Returns:
+        list of ids of users with inbox sockets.
+    """
+    if not user_ids:
+        return []
+    socket_counts = settings.REDIS_CLIENT.hmget(INBOX_ONLINES_KEY, user_ids)
+    return [user_id for user_id, socket_count in zip(user_ids, socket_counts) if socket_count is not None]
+
+
+def flush_local_presence():
+    """Remove all presence entries added by sockets of this process.
+
+    Returns:
+        number of removed entries.
+    """
+    with local_entries_lock:
+        entries = list(local_entries)
+        local_entries.clear()
+        inbox_entries = list(local_inbox_entries.items())
+        local_inbox_entries.clear()
+    if entries or inbox_entries:
+        pipeline = settings.REDIS_CLIENT.pipeline()
+        for room_name, username in entries:
+            pipeline.srem(f'{room_name}_onlines', bytes(username, 'utf-8'))
+        for user_id, socket_count in inbox_entries:
+            pipeline.eval(REMOVE_INBOX_ONLINE_SCRIPT, 1, INBOX_ONLINES_KEY, user_id, socket_count)
+        pipeline.execute()
+    return len(entries) + len(inbox_entries)
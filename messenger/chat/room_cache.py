@@ -0,0 +1,216 @@
+"""Module with process-local cache of room metadata.
+
+Rooms are resolved by name on every socket connect and room page, while
+their id, name and type almost never change. Saved and deleted rooms are
+dropped from the cache of every process through a channel layer group,
+entries also expire after ROOM_CACHE_TTL in case a notice is lost.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from messenger.chat.models import Room
+
+logger = logging.getLogger(__name__)
+
+ROOM_CACHE_GROUP = 'room_cache'
+# Cached fields in the order of model fields, other fields are loaded on access.
+ROOM_CACHE_FIELDS = ('id', 'name', 'type')
+LISTENER_RETRY_DELAY = 5
+
+
+class RoomCache:
+    """Bounded LRU of room metadata by room name, counting hits and misses."""
+
+    def __init__(self, max_size, ttl):
+        """Create RoomCache object.
+
+        Args:
+            max_size: maximum number of cached rooms;
+            ttl: seconds to keep room metadata.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        """Get metadata of the room, loading it from the database on miss.
+
+        Args:
+            name: name of the room.
+
+        Returns:
+            tuple of ROOM_CACHE_FIELDS values or None if there is no such room.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(name)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self.generation
+        # Replicas may lag behind the invalidation, a stale row would be cached for ROOM_CACHE_TTL.
+        metadata = Room.objects.using(DEFAULT_DB_ALIAS).filter(name=name).values_list(*ROOM_CACHE_FIELDS).first()
+        with self.lock:
+            # Room changed while it was loaded, the loaded metadata may be stale.
+            if metadata is not None and generation == self.generation:
+                self.entries[name] = (metadata, now + self.ttl)
+                self.entries.move_to_end(name)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return metadata
+
+    def invalidate(self, room_id, names):
+        """Drop the room from the cache, whatever name it is cached by.
+
+        Args:
+            room_id: id of the room;
+            names: names the room had.
+        """
+        with self.lock:
+            self.generation += 1
+            stale_names = [
+                name for name, (metadata, _) in self.entries.items() if metadata[0] == room_id or name in names
+            ]
+            for name in stale_names:
+                del self.entries[name]
+
+    def clear(self):
+        """Drop all rooms from the cache."""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def get_stats(self):
+        """Get cache effectiveness counters.
+
+        Returns:
+            dictionary with hits, misses, hit ratio and number of cached rooms.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries),
+            }
+
+
+room_cache = RoomCache(settings.ROOM_CACHE_SIZE, settings.ROOM_CACHE_TTL)
+listener_lock = threading.Lock()
+listener_thread = None
+
+
+def get_room(name):
+    """Get room by name with cached fields, other fields are loaded on access.
+
+    Args:
+        name: name of the room.
+
+    Returns:
+        room or None if there is no such room.
+    """
+    start_invalidation_listener()
+    metadata = room_cache.get(name)
+    if metadata is None:
+        return None
+    return Room.from_db(DEFAULT_DB_ALIAS, ROOM_CACHE_FIELDS, metadata)
+
+
+def invalidate_room(room_id, names):
+    """Drop the room from caches of this process now and of all processes on commit.
+
+    Args:
+        room_id: id of the room;
+        names: names the room had.
+    """
+    room_cache.invalidate(room_id, names)
+    transaction.on_commit(lambda: broadcast_invalidation(room_id, names))
+
+
+def broadcast_invalidation(room_id, names):
+    """Drop the room from caches of all processes.
+
+    Args:
+        room_id: id of the room;
+        names: names the room had.
+    """
+    room_cache.invalidate(room_id, names)
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            ROOM_CACHE_GROUP, {'type': 'room.invalidate', 'room_id': room_id, 'names': list(names)},
+        )
+    except Exception:
+        # Room is saved already, other processes drop it after ROOM_CACHE_TTL.
+        logger.warning('Room cache invalidation of room %i was not sent', room_id, exc_info=True)
+
+
+def start_invalidation_listener():
+    """Start thread receiving invalidations from other processes, once per process."""
+    global listener_thread
+    if listener_thread is not None:
+        return
+    with listener_lock:
+        if listener_thread is None:
+            listener_thread = threading.Thread(
+                target=run_invalidation_listener, name='room-cache-invalidation', daemon=True,
+            )
+            listener_thread.start()
+
+
+def run_invalidation_listener():
+    """Receive invalidations forever, restarting after channel layer errors."""
+    while True:
+        try:
+            asyncio.run(listen_invalidations())
+        except Exception:
+            logger.warning('Room cache invalidation listener failed, restarting', exc_info=True)
+        # Invalidations sent while listener was down are lost.
+        room_cache.clear()
+        time.sleep(LISTENER_RETRY_DELAY)
+
+
+async def listen_invalidations():
+    """Drop rooms invalidated by other processes, reporting cache stats periodically."""
+    channel_layer = get_channel_layer()
+    channel_name = await channel_layer.new_channel()
+    next_report = time.monotonic() + settings.ROOM_CACHE_STATS_INTERVAL
+    while True:
+        # Group membership expires in the channel layer, so it is renewed every time.
+        await channel_layer.group_add(ROOM_CACHE_GROUP, channel_name)
+        try:
+            message = await asyncio.wait_for(
+                channel_layer.receive(channel_name), max(next_report - time.monotonic(), 0),
+            )
+        except asyncio.TimeoutError:
+            message = None
+        if message is not None:
+            room_cache.invalidate(message['room_id'], message['names'])
+        if time.monotonic() >= next_report:
+            next_report += settings.ROOM_CACHE_STATS_INTERVAL
+            log_stats()
+
+
+def log_stats():
+    """Log hit ratio of the cache."""
+    stats = room_cache.get_stats()
+    if stats['hits'] or stats['misses']:
+        logger.info(
+            'Room cache hit ratio %.2f: %i hits, %i misses, %i rooms cached',
+            stats['hit_ratio'], stats['hits'], stats['misses'], stats['size'],
+        )
@@ -0,0 +1,125 @@
+"""Module with database routing for chat app."""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+replica_reads_enabled = ContextVar('replica_reads_enabled', default=False)
+
+
+def get_primary_pin_key(user_id):
+    """Get redis key pinning user reads to the primary database.
+
+    Args:
+        user_id: id of the user.
+
+    Returns:
+        redis key name.
+    """
+    return f'{user_id}_primary_pin'
+
+
+def pin_to_primary(user):
+    """Send reads of the user to the primary database for a while after write.
+
+    Args:
+        user: user who has just written to the database.
+    """
+    if settings.DATABASE_REPLICAS:
+        settings.REDIS_CLIENT.set(get_primary_pin_key(user.id), 1, ex=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    """Check reads of the user must go to the primary database.
+
+    Args:
+        user: user to check.
+
+    Returns:
+        True if user has recently written to the database.
+    """
+    if not user.is_authenticated:
+        return False
+    return bool(settings.REDIS_CLIENT.exists(get_primary_pin_key(user.id)))
+
+
+@contextmanager
+def replica_reads(user):
+    """Route reads inside the block to replicas unless user is pinned to primary.
+
+    Args:
+        user: user reads are made for.
+
+    Yields:
+        None.
+    """
+    enabled = bool(settings.DATABASE_REPLICAS) and not is_pinned_to_primary(user)
+    token = replica_reads_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads_enabled.reset(token)
+
+
+class ReplicaRouter:
+    """Router sending reads from replica_reads blocks to replicas."""
+
+    def db_for_read(self, model, **hints):
+        """Choose database for read queries.
+
+        Args:
+            model: model to read;
+            hints: routing hints.
+
+        Returns:
+            replica alias inside replica_reads block, None otherwise.
+        """
+        if replica_reads_enabled.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Choose database for write queries.
+
+        Writes always go to the primary, even for instances read from replica.
+
+        Args:
+            model: model to write;
+            hints: routing hints.
+
+        Returns:
+            primary database alias.
+        """
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Allow relations between objects from primary and replicas.
+
+        Args:
+            obj1: first object;
+            obj2: second object;
+            hints: routing hints.
+
+        Returns:
+            True, all databases contain the same data.
+        """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Forbid migrations on replicas.
+
+        Args:
+            db: database alias;
+            app_label: label of migrated app;
+            model_name: name of migrated model;
+            hints: routing hints.
+
+        Returns:
+            False for replicas, None otherwise.
+        """
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -1,10 +1,17 @@
 """Module with routing."""
 
-from channels.routing import URLRouter
+from channels.routing import ChannelNameRouter, URLRouter
+from django.conf import settings
 from django.urls import re_path
 
 from messenger.chat import consumers
+from messenger.chat.actors import RoomOwnerConsumer
 
 url_router = URLRouter([
+    re_path(r'^ws/inbox/$', consumers.InboxConsumer.as_asgi()),
     re_path(r'^ws/chat/(?P<room_name>.+)/$', consumers.ChatConsumer.as_asgi()),
 ])
+
+channel_router = ChannelNameRouter({
+    channel: RoomOwnerConsumer.as_asgi() for channel in settings.ROOM_OWNER_CHANNELS
+})
@@ -0,0 +1,231 @@
+"""Module with signal handlers for chat app."""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from messenger.chat.inbox import add_room_members, record_message, record_read, remove_room_members
+from messenger.chat.models import Message, Room
+from messenger.chat.room_cache import invalidate_room
+from messenger.chat.versions import (
+    ROOMS_VERSION_KEY,
+    USERS_VERSION_KEY,
+    bump_versions,
+    get_room_version_key,
+    get_user_version_key,
+)
+
+User = get_user_model()
+Participants = Room.participant.through
+
+
+def get_user_room_ids(user_id):
+    """Get ids of rooms the user participates in.
+
+    Args:
+        user_id: id of the user.
+
+    Returns:
+        list of room ids.
+    """
+    return list(Participants.objects.filter(user_id=user_id).values_list('room_id', flat=True))
+
+
+@receiver(post_save, sender=Message)
+def bump_message_versions(sender, instance, created, **kwargs):
+    """Bump version of the page of the room with the new message.
+
+    Args:
+        sender: model class;
+        instance: saved message;
+        created: True if message is new;
+        kwargs: other signal arguments.
+    """
+    if not created:
+        return
+    # Lists of members change with their inbox entries, which they are versioned by.
+    bump_versions(get_room_version_key(instance.room.name))
+
+
+@receiver(m2m_changed, sender=Message.read_users.through)
+def bump_read_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump versions of the room and users who read the message.
+
+    Args:
+        sender: intermediate model class;
+        instance: message which read users changed;
+        action: type of m2m change;
+        reverse: True if change is made from the user side;
+        pk_set: ids of added users;
+        kwargs: other signal arguments.
+    """
+    if action != 'post_add' or reverse or not pk_set:
+        return
+    bump_versions(
+        get_room_version_key(instance.room.name),
+        *[get_user_version_key(user_id) for user_id in pk_set],
+    )
+
+
+@receiver(m2m_changed, sender=Room.participant.through)
+def bump_membership_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Bump versions of the room and users whose membership changed.
+
+    Args:
+        sender: intermediate model class;
+        instance: room which participants changed;
+        action: type of m2m change;
+        reverse: True if change is made from the user side;
+        pk_set: ids of added or removed users;
+        kwargs: other signal arguments.
+    """
+    if action not in {'post_add', 'post_remove', 'post_clear'} or reverse:
+        return
+    bump_versions(
+        get_room_version_key(instance.name),
+        *[get_user_version_key(user_id) for user_id in pk_set or ()],
+    )
+
+
+@receiver(post_save, sender=Message)
+def update_inbox_on_message(sender, instance, created, **kwargs):
+    """Update inbox summaries of room members with the new message.
+
+    Args:
+        sender: model class;
+        instance: saved message;
+        created: True if message is new;
+        kwargs: other signal arguments.
+    """
+    if created:
+        record_message(instance)
+
+
+@receiver(m2m_changed, sender=Message.read_users.through)
+def update_inbox_on_read(sender, instance, action, reverse, pk_set, **kwargs):
+    """Decrease unread counts in inbox summaries of users who read the message.
+
+    Args:
+        sender: intermediate model class;
+        instance: message which read users changed;
+        action: type of m2m change;
+        reverse: True if change is made from the user side;
+        pk_set: ids of added users;
+        kwargs: other signal arguments.
+    """
+    if action == 'post_add' and not reverse and pk_set:
+        record_read(instance, pk_set)
+
+
+@receiver(m2m_changed, sender=Room.participant.through)
+def update_inbox_on_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    """Create or delete inbox summaries of users whose membership changed.
+
+    Args:
+        sender: intermediate model class;
+        instance: room which participants changed;
+        action: type of m2m change;
+        reverse: True if change is made from the user side;
+        pk_set: ids of added or removed users;
+        kwargs: other signal arguments.
+    """
+    if reverse:
+        return
+    if action == 'post_add' and pk_set:
+        add_room_members(instance, pk_set)
+    elif action == 'post_remove' and pk_set:
+        remove_room_members(instance, pk_set)
+    elif action == 'post_clear':
+        remove_room_members(instance)
+
+
+@receiver(m2m_changed, sender=Room.participant.through)
+def update_members_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recalculate denormalized participants count of changed rooms.
+
+    Args:
+        sender: intermediate model class;
+        instance: room or user which membership changed;
+        action: type of m2m change;
+        reverse: True if change is made from the user side;
+        pk_set: ids of added or removed users or rooms;
+        kwargs: other signal arguments.
+    """
+    if reverse and action == 'pre_clear':
+        instance.cleared_room_ids = get_user_room_ids(instance.id)
+    if action not in {'post_add', 'post_remove', 'post_clear'}:
+        return
+    if not reverse:
+        Room.refresh_members_count([instance.id])
+    elif action == 'post_clear':
+        Room.refresh_members_count(getattr(instance, 'cleared_room_ids', []))
+    elif pk_set:
+        Room.refresh_members_count(pk_set)
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_rooms(sender, instance, **kwargs):
+    """Remember rooms of deleted user, memberships are deleted without m2m signals.
+
+    Args:
+        sender: model class;
+        instance: deleted user;
+        kwargs: other signal arguments.
+    """
+    instance.cleared_room_ids = get_user_room_ids(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def update_members_count_on_user_delete(sender, instance, **kwargs):
+    """Recalculate participants count of rooms of deleted user.
+
+    Args:
+        sender: model class;
+        instance: deleted user;
+        kwargs: other signal arguments.
+    """
+    Room.refresh_members_count(getattr(instance, 'cleared_room_ids', []))
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def bump_room_versions(sender, instance, **kwargs):
+    """Bump versions of pages listing rooms.
+
+    Args:
+        sender: model class;
+        instance: saved or deleted room;
+        kwargs: other signal arguments.
+    """
+    bump_versions(get_room_version_key(instance.name), ROOMS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_cached_room(sender, instance, **kwargs):
+    """Drop changed room from room metadata caches of all processes.
+
+    Args:
+        sender: model class;
+        instance: saved or deleted room;
+        kwargs: other signal arguments.
+    """
+    invalidate_room(instance.id, [instance.name])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_users_version(sender, instance, update_fields=None, **kwargs):
+    """Bump version of pages listing users.
+
+    Saves of other fields, like last_login on every login, are skipped.
+
+    Args:
+        sender: model class;
+        instance: saved or deleted user;
+        update_fields: fields updated by save;
+        kwargs: other signal arguments.
+    """
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    bump_versions(USERS_VERSION_KEY)
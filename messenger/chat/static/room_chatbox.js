@@ -2,7 +2,10 @@ console.log("Sanity check from room.js.");
 
 const roomName = JSON.parse(document.getElementById('roomName').textContent);
 const currentUser = document.getElementById("currentUser").value;
-const chatSocket = new WebSocket("ws://" + window.location.host + "/ws/chat/" + roomName + "/");
+// code server closes sockets with on deploy, reconnect is spread over a few seconds
+const restartCloseCode = 4012;
+let chatSocket = null;
+let isReconnect = false;
 
 const chatLog = document.querySelector("#chatLog");
 const chatMessageInput = document.querySelector("#chatMessageInput");
@@ -17,6 +20,8 @@ let isLastUpMessage = false;
 let isLastDownMessage = false;
 let isTyping = false;
 let timeoutId = null;
+let participantsCursor = null;
+let isParticipantsLoading = false;
 
 
 const optionsForObserver = {
@@ -49,6 +54,31 @@ function usersSelectorAdd(username) {
     allUsersSelector.appendChild(newLi);
 }
 
+// adds a page of participants to 'allUsersSelector', online ones are marked
+function addParticipants(users) {
+    for (let i = 0; i < users.length; i++) {
+        usersSelectorAdd(users[i].user);
+        if (users[i].online) {
+            onlineUsersSelectorAdd(users[i].user);
+        }
+    }
+}
+
+function requestParticipants(cursor = null) {
+    if (!allUsersSelector.dataset.lazy || isParticipantsLoading) return;
+    isParticipantsLoading = true;
+    chatSocket.send(JSON.stringify({
+        "type": "participants",
+        "cursor": cursor,
+    }));
+}
+
+function onParticipantsScroll() {
+    if (participantsCursor && allUsersSelector.scrollHeight - allUsersSelector.scrollTop - allUsersSelector.clientHeight < 50) {
+        requestParticipants(participantsCursor);
+    }
+}
+
 // removes an option from 'usersSelector'
 function onlineUsersSelectorRemove(username) {
     let oldLi= document.querySelector('li[data-username="' + username + '"]');
@@ -246,6 +276,8 @@ chatMessageInput.addEventListener("input", onInputChatMessageInput);
 
 chatLog.addEventListener("scroll", onChatLogScroll);
 
+allUsersSelector.addEventListener("scroll", onParticipantsScroll);
+
 // clear the 'chatMessageInput' and forward the message
 chatMessageSend.onclick = function() {
     if (chatMessageInput.value.length === 0) return;
@@ -260,20 +292,41 @@ document.addEventListener("beforeunload", function() {
     chatMessageInput.removeEventListener("change", onInputChatMessageChange);
     chatMessageInput.removeEventListener("input", onInputChatMessageInput);
     chatLog.removeEventListener("scroll", onChatLogScroll);
+    allUsersSelector.removeEventListener("scroll", onParticipantsScroll);
 });
 
 
+// server sends start messages again on reconnect, so the page state is reset
+function resetChatState() {
+    chatLog.textContent = '';
+    allUsersSelector.textContent = '';
+    pageUp = 0;
+    pageDown = 0;
+    isLastUpMessage = false;
+    isLastDownMessage = false;
+    participantsCursor = null;
+    isParticipantsLoading = false;
+}
+
 function connect() {
+    chatSocket = new WebSocket("ws://" + window.location.host + "/ws/chat/" + roomName + "/");
+
     chatSocket.onopen = function(e) {
         console.log("Successfully connected to the WebSocket.");
+        if (isReconnect) {
+            resetChatState();
+        }
+        requestParticipants();
     }
 
     chatSocket.onclose = function(e) {
-        console.log("WebSocket connection closed unexpectedly. Trying to reconnect in 2s...");
+        const delay = e.code === restartCloseCode ? 1000 + Math.random() * 4000 : 2000;
+        console.log("WebSocket connection closed. Trying to reconnect in " + Math.round(delay) + "ms...");
+        isReconnect = true;
         setTimeout(function() {
             console.log("Reconnecting...");
             connect();
-        }, 2000);
+        }, delay);
     };
 
     chatSocket.onmessage = function(e) {
@@ -341,6 +394,13 @@ function connect() {
         case "read_message":
             readMessage(data.message_id);
             break;
+        case "participants":
+            addParticipants(data.users);
+            document.getElementById("membersCount").textContent = data.count;
+            participantsCursor = data.cursor;
+            isParticipantsLoading = false;
+            onParticipantsScroll();
+            break;
         default:
             console.error("Unknown message type!");
             break;
@@ -0,0 +1,82 @@
+const inboxSocket = new WebSocket("ws://" + window.location.host + "/ws/inbox/");
+// code server closes sockets with on deploy
+const restartCloseCode = 4012;
+
+
+// finds row of the room list the notice is about
+function getInboxRow(data) {
+    if (data.peer) {
+        return document.querySelector('tr[data-username="' + data.peer + '"]');
+    }
+    return document.querySelector('tr[data-room="' + data.room + '"]');
+}
+
+// changes the unread badge of the row by 'delta'
+function changeUnreadCount(row, delta) {
+    let badge = row.querySelector(".count-not-read");
+    if (!badge) {
+        badge = document.createElement("span");
+        badge.classList.add("count-not-read");
+        badge.textContent = "0";
+        row.querySelector("td a").after(badge);
+    }
+
+    const count = Math.max(parseInt(badge.textContent) + delta, 0);
+    if (count) {
+        badge.textContent = count;
+    } else {
+        badge.remove();
+    }
+}
+
+// shows the new message in the row and moves the row to the top
+function setLastActivity(row, data) {
+    const lastActivity = row.querySelector(".last-activity");
+    if (lastActivity) {
+        lastActivity.textContent = data.time;
+        lastActivity.setAttribute("title", data.date);
+    }
+    const preview = row.querySelector(".preview");
+    if (preview) {
+        preview.textContent = data.preview;
+    }
+    row.parentNode.prepend(row);
+}
+
+
+function connectInbox() {
+    inboxSocket.onopen = function(e) {
+        console.log("Successfully connected to the inbox WebSocket.");
+    }
+
+    inboxSocket.onclose = function(e) {
+        if (e.code !== restartCloseCode) {
+            console.log("Inbox WebSocket connection closed, badges are updated on page reload.");
+            return;
+        }
+        // notices are missed while reconnecting, so the list is reloaded, spread over a few seconds
+        setTimeout(function() {
+            window.location.reload();
+        }, 1000 + Math.random() * 4000);
+    };
+
+    inboxSocket.onmessage = function(e) {
+        const data = JSON.parse(e.data);
+        const row = getInboxRow(data);
+        if (!row) return;
+
+        switch (data.type) {
+            case "inbox_message":
+                changeUnreadCount(row, 1);
+                setLastActivity(row, data);
+                break;
+            case "inbox_read":
+                changeUnreadCount(row, -1);
+                break;
+            default:
+                console.error("Unknown message type!");
+                break;
+        }
+    };
+}
+connectInbox();
@@ -0,0 +1,60 @@
+"""Module with tests of hot chat query plans."""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from messenger.chat.management.commands.check_query_plans import (
+    analyze_tables,
+    capture_queries,
+    get_hot_queries,
+    get_used_indexes,
+    seed_database,
+)
+
+SEED_MESSAGES = 5000
+ROOM_MESSAGE_INDEXES = frozenset(('chat_message_room_id_idx', 'chat_message_room_time_idx'))
+
+
+class QueryPlanTests(TestCase):
+    """Plans of hot queries on seeded data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed synthetic rooms and messages."""
+        cls.room, cls.user = seed_database(SEED_MESSAGES)
+        analyze_tables()
+
+    def get_plan_indexes(self, query_name):
+        """Get indexes read by plans of the hot query.
+
+        Args:
+            query_name: name of the hot query.
+
+        Returns:
+            set of index names.
+        """
+        function = get_hot_queries(self.room, self.user)[query_name]
+        indexes = set()
+        for sql, params in capture_queries(function).items():
+            indexes |= get_used_indexes(sql, params)
+        return indexes
+
+    def test_hot_queries_avoid_full_scans(self):
+        """Command finds no full scans of large tables."""
+        call_command('check_query_plans', room=self.room.name, stdout=StringIO())
+
+    def test_room_messages_use_room_indexes(self):
+        """Messages of the room are found by room indexes, not by the room foreign key index."""
+        for query_name in ('chat start messages', 'chat paginate down', 'chat paginate up'):
+            with self.subTest(query_name=query_name):
+                self.assertTrue(self.get_plan_indexes(query_name) & ROOM_MESSAGE_INDEXES)
+
+    def test_dropped_room_indexes_are_noticed(self):
+        """Without room indexes the plans fall back to other indexes and the test above fails."""
+        with connection.cursor() as cursor:
+            for index_name in sorted(ROOM_MESSAGE_INDEXES):
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index_name)}')
+        self.assertFalse(self.get_plan_indexes('chat start messages') & ROOM_MESSAGE_INDEXES)
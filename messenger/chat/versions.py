@@ -0,0 +1,87 @@
+"""Module with version counters of chat pages.
+
+Counters are stored in redis and bumped by model signals, so every worker
+sees the same versions and can answer repeat requests with 304 responses.
+"""
+
+import time
+
+from django.conf import settings
+
+ROOMS_VERSION_KEY = 'version:rooms'
+USERS_VERSION_KEY = 'version:users'
+ROOM_VERSION_KEY_TEMPLATE = 'version:room:{room_name}'
+USER_VERSION_KEY_TEMPLATE = 'version:user:{user_id}'
+
+
+def get_room_version_key(room_name):
+    """Get redis key of the room version counter.
+
+    Args:
+        room_name: name of the chatroom.
+
+    Returns:
+        redis key name.
+    """
+    return ROOM_VERSION_KEY_TEMPLATE.format(room_name=room_name)
+
+
+def get_user_version_key(user_id):
+    """Get redis key of the user version counter.
+
+    Args:
+        user_id: id of the user.
+
+    Returns:
+        redis key name.
+    """
+    return USER_VERSION_KEY_TEMPLATE.format(user_id=user_id)
+
+
+def bump_versions(*keys):
+    """Increment version counters and remember time of modification.
+
+    Args:
+        keys: redis keys of counters to increment.
+    """
+    modified = time.time()
+    pipeline = settings.REDIS_CLIENT.pipeline(transaction=False)
+    for key in keys:
+        pipeline.incr(key)
+        pipeline.set(f'{key}:modified', modified)
+    pipeline.execute()
+
+
+def get_versions(keys):
+    """Get current values of version counters in one lookup.
+
+    Args:
+        keys: redis keys of counters.
+
+    Returns:
+        list of counter values, 0 for counters never bumped.
+    """
+    if not keys:
+        return []
+    return [int(version or 0) for version in settings.REDIS_CLIENT.mget(keys)]
+
+
+def get_page_version(keys, user_id, last_activity=None):
+    """Get ETag and last modification time of the page built from counters.
+
+    Args:
+        keys: redis keys of counters the page depends on;
+        user_id: id of the user page is rendered for;
+        last_activity: time of the latest inbox activity shown on the page, None if there is none.
+
+    Returns:
+        pair of ETag value and modification timestamp or None.
+    """
+    values = settings.REDIS_CLIENT.mget(keys + [f'{key}:modified' for key in keys])
+    versions = [int(version or 0) for version in values[:len(keys)]]
+    modified = [float(timestamp) for timestamp in values[len(keys):] if timestamp is not None]
+    if last_activity is not None:
+        versions.append(int(last_activity.timestamp() * 1000000))
+        modified.append(last_activity.timestamp())
+    etag = '"{0}"'.format('-'.join(str(part) for part in (user_id, *versions)))
+    return etag, max(modified) if modified else None
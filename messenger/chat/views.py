@@ -3,18 +3,118 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.views import View
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.views.generic.list import ListView
 from django.conf import settings
-from messenger.chat.models import Message, Room, RoomType
+from django.db.models import Max
+from django.http import Http404, JsonResponse
+from messenger.chat.health import run_readiness_checks
+from messenger.chat.inbox import get_inbox_page
+from messenger.chat.models import InboxEntry, Room, RoomType
+from messenger.chat.room_cache import get_room
+from messenger.chat.routers import pin_to_primary, replica_reads
+from messenger.chat.versions import (
+    ROOMS_VERSION_KEY,
+    ROOM_VERSION_KEY_TEMPLATE,
+    USERS_VERSION_KEY,
+    USER_VERSION_KEY_TEMPLATE,
+    bump_versions,
+    get_page_version,
+    get_room_version_key,
+    get_versions,
+)
 
 User = get_user_model()
 
+INBOX_PAGE_SIZE = 50
+
+
+def get_direct_room(first_user, second_user):
+    """Get direct messages room of two users.
+
+    Args:
+        first_user: one member of the room;
+        second_user: another member of the room.
+
+    Returns:
+        room or None if users have no direct messages room.
+    """
+    return (
+        get_room(f'__{first_user.username}_{second_user.username}_direct__')
+        or get_room(f'__{second_user.username}_{first_user.username}_direct__')
+    )
+
+
+class ReplicaReadMixin:
+    """Mixin routing reads of the view to database replicas."""
+
+    def dispatch(self, request, *args, **kwargs):
+        """Handle request reading from replicas.
+
+        Args:
+            request: current request.
+
+        Returns:
+            rendered response.
+        """
+        with replica_reads(request.user):
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+
+class ConditionalPageMixin:
+    """Mixin answering 304 to repeat requests of unchanged pages."""
+
+    # Redis keys of version counters the page depends on, formatted with view kwargs and user_id.
+    version_keys = (USER_VERSION_KEY_TEMPLATE,)
+    # Type of rooms which inbox entries the page lists, None if it lists none.
+    inbox_room_type = None
+
+    def get_last_inbox_activity(self):
+        """Get time of the latest change of inbox entries listed on the page.
+
+        Returns:
+            datetime or None if the page lists no inbox entries.
+        """
+        if self.inbox_room_type is None:
+            return None
+        return InboxEntry.objects.filter(
+            user=self.request.user, room_type=self.inbox_room_type,
+        ).aggregate(last_activity=Max('last_activity'))['last_activity']
+
+    def check_page_access(self):
+        """Check the user may see the page, before its version is compared."""
+
+    def get(self, request, *args, **kwargs):
+        """Handle get-request, render page only if it changed.
+
+        Args:
+            request: current request.
+
+        Returns:
+            rendered page or not modified response.
+        """
+        self.check_page_access()
+        keys = [key.format(user_id=request.user.id, **self.kwargs) for key in self.version_keys]
+        etag, last_modified = get_page_version(keys, request.user.id, self.get_last_inbox_activity())
+        last_modified = int(last_modified) if last_modified is not None else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
 
 class RoomBaseView(LoginRequiredMixin):
     """Base view class for Room objects."""
@@ -44,16 +144,30 @@ class RoomBaseView(LoginRequiredMixin):
         """
         room_name = self.kwargs.get('room_name')
         if room_name:
-            room = get_object_or_404(Room, name=room_name)
-            if self.request.user in room.participant.all():
+            room = get_room(room_name)
+            if room is None:
+                raise Http404
+            if room.participant.filter(id=self.request.user.id).exists():
                 return room
             raise PermissionDenied
 
 
-class RoomListView(RoomBaseView, ListView):
+class RoomListView(ReplicaReadMixin, ConditionalPageMixin, RoomBaseView, ListView):
     """View for list of Room objects."""
 
     template_name = 'rooms_list.html'
+    version_keys = (ROOMS_VERSION_KEY, USER_VERSION_KEY_TEMPLATE)
+    inbox_room_type = RoomType.common_channel
+
+    def get_inbox_entries(self):
+        """Get inbox entries of common channels of the user.
+
+        Returns:
+            queryset of inbox entries.
+        """
+        return InboxEntry.objects.filter(
+            user=self.request.user, room_type=RoomType.common_channel, room__deleted_at__isnull=True,
+        ).select_related('room')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         """Get context for rendering.
@@ -65,16 +179,41 @@ class RoomListView(RoomBaseView, ListView):
             new context dictionary.
         """
         context = super().get_context_data(**kwargs)
-        context['room_list'] = Room.objects.filter(type=RoomType.common_channel)
-        for room in context['room_list']:
-            room.unread = Message.objects.filter(~Q(read_users__id=self.request.user.id), room=room).count()
+        entries, context['next_cursor'] = get_inbox_page(
+            self.get_inbox_entries(), self.request.GET.get('before'), INBOX_PAGE_SIZE,
+        )
+        versions = get_versions([get_room_version_key(entry.room.name) for entry in entries])
+        context['room_list'] = []
+        for entry, version in zip(entries, versions):
+            room = entry.room
+            room.version = version
+            room.unread = entry.unread_count
+            room.preview = entry.preview
+            room.last_activity = entry.last_activity
+            context['room_list'].append(room)
         return context
 
 
-class RoomDetailView(RoomBaseView, DetailView):
+class RoomDetailView(ReplicaReadMixin, ConditionalPageMixin, RoomBaseView, DetailView):
     """Detail view for Room chatbox."""
 
     template_name = 'room_detail.html'
+    version_keys = (ROOM_VERSION_KEY_TEMPLATE, USER_VERSION_KEY_TEMPLATE)
+
+    def check_page_access(self):
+        """Check the user is a member of the room, so former members don't get 304 for it."""
+        self.object = super().get_object()
+
+    def get_object(self, queryset=None):
+        """Get room checked by check_page_access.
+
+        Args:
+            queryset: object queryset where to get object for view.
+
+        Returns:
+            room object to view.
+        """
+        return self.object
 
     def get_context_data(self, **kwargs):
         """Get context for rendering.
@@ -84,12 +223,9 @@ class RoomDetailView(RoomBaseView, DetailView):
         """
         context = super().get_context_data(**kwargs)
         room_name = self.kwargs.get('room_name')
-        room = Room.objects.get(name=room_name)
-        if room_name and room.type == RoomType.direct_messages:
+        if room_name and self.object.type == RoomType.direct_messages:
             context['direct_user'] = room_name.replace('direct', '').replace(self.request.user.username, '')
             context['direct_user'] = context['direct_user'].replace('_', '')
-        if room_name and room.type == RoomType.common_channel:
-            context['participants'] = [part.username for part in room.participant.all()]
         return context
 
 
@@ -108,8 +244,9 @@ class RoomCreateView(RoomBaseView, CreateView):
             handled form.
         """
         form.instance.type = RoomType.common_channel
-        form.save()
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        pin_to_primary(self.request.user)
+        return response
 
 
 class RoomUpdateView(RoomBaseView, UpdateView):
@@ -129,10 +266,25 @@ class RoomUpdateView(RoomBaseView, UpdateView):
         Raises:
             PermissionDenied: if user tries to update direct messages room.
         """
-        room_name = self.kwargs.get('room_name')
-        if room_name and 'direct__' in room_name:
+        room = get_room(self.kwargs.get('room_name'))
+        if room is None:
+            raise Http404
+        if room.type == RoomType.direct_messages:
             raise PermissionDenied
-        return Room.objects.get(name=room_name)
+        return room
+
+    def form_valid(self, form):
+        """Save the room, reading it back from the primary database.
+
+        Args:
+            form: valid room form.
+
+        Returns:
+            redirect to success_url.
+        """
+        response = super().form_valid(form)
+        pin_to_primary(self.request.user)
+        return response
 
 
 class RoomDeleteView(RoomBaseView, DeleteView):
@@ -140,25 +292,57 @@ class RoomDeleteView(RoomBaseView, DeleteView):
 
     template_name = 'room_confirm_delete.html'
 
-    def delete(self, request, *args, **kwargs):
-        """Delete the object.
+    def form_valid(self, form):
+        """Hide the room, its messages are purged by purge_deleted_rooms command.
 
         Args:
-            request: current request.
+            form: confirmation form.
 
         Returns:
             redirect to success_url.
         """
-        delete_object = self.get_object()
-        settings.REDIS_CLIENT.delete(f'{delete_object.name}_onlines')
-        return super().delete(request, *args, **kwargs)
+        room_name = self.object.name
+        self.object.soft_delete()
+        pin_to_primary(self.request.user)
+        settings.REDIS_CLIENT.delete(f'{room_name}_onlines')
+        bump_versions(get_room_version_key(room_name))
+        return redirect(self.get_success_url())
 
 
-class DirectListView(LoginRequiredMixin, ListView):
+class DirectListView(ReplicaReadMixin, ConditionalPageMixin, LoginRequiredMixin, ListView):
     """View for list of direct messages chats."""
 
     template_name = 'user_direct_list.html'
-    queryset = User.objects.all()
+    model = InboxEntry
+    version_keys = (USERS_VERSION_KEY, USER_VERSION_KEY_TEMPLATE)
+    inbox_room_type = RoomType.direct_messages
+
+    def get_inbox_entries(self):
+        """Get inbox entries of direct rooms of the user.
+
+        Returns:
+            queryset of inbox entries.
+        """
+        return InboxEntry.objects.filter(
+            user=self.request.user,
+            room_type=RoomType.direct_messages,
+            room__deleted_at__isnull=True,
+            peer__isnull=False,
+        ).select_related('room', 'peer')
+
+    def get(self, request, *args, **kwargs):
+        """Handle get-request, open direct chat if username is given.
+
+        Args:
+            request: current request.
+
+        Returns:
+            list page or redirect to direct messages room.
+        """
+        username = request.GET.get('username')
+        if username:
+            return redirect('chat:direct_chatbox', username=username)
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         """Get context for rendering.
@@ -170,16 +354,18 @@ class DirectListView(LoginRequiredMixin, ListView):
             new context dictionary.
         """
         context = super().get_context_data(**kwargs)
-        context['room_list'] = Room.objects.filter(type=RoomType.common_channel)
-        for user in context['user_list']:
-            if Room.objects.filter(name=f'__{self.request.user.username}_{user.username}_direct__').exists():
-                direct_room = Room.objects.get(name=f'__{self.request.user.username}_{user.username}_direct__')
-            elif Room.objects.filter(name=f'__{user.username}_{self.request.user.username}_direct__').exists():
-                direct_room = Room.objects.get(name=f'__{user.username}_{self.request.user.username}_direct__')
-            else:
-                user.unread = 0
-                continue
-            user.unread = Message.objects.filter(~Q(read_users__id=self.request.user.id), room=direct_room).count()
+        entries, context['next_cursor'] = get_inbox_page(
+            self.get_inbox_entries(), self.request.GET.get('before'), INBOX_PAGE_SIZE,
+        )
+        versions = get_versions([get_room_version_key(entry.room.name) for entry in entries])
+        context['user_list'] = []
+        for entry, version in zip(entries, versions):
+            user = entry.peer
+            user.version = version
+            user.unread = entry.unread_count
+            user.preview = entry.preview
+            user.last_activity = entry.last_activity
+            context['user_list'].append(user)
         return context
 
 
@@ -202,16 +388,14 @@ class DirectDetailView(View, LoginRequiredMixin):
         second_user = get_object_or_404(User, username=self.kwargs.get('username'))
         if first_user == second_user:
             raise PermissionDenied
-        if Room.objects.filter(name=f'__{first_user.username}_{second_user.username}_direct__').exists():
-            room = Room.objects.get(name=f'__{first_user.username}_{second_user.username}_direct__')
-        elif Room.objects.filter(name=f'__{second_user.username}_{first_user.username}_direct__').exists():
-            room = Room.objects.get(name=f'__{second_user.username}_{first_user.username}_direct__')
-        else:
+        room = get_direct_room(first_user, second_user)
+        if room is None:
             room = Room.objects.create(
                 type=RoomType.direct_messages,
                 name=f'__{first_user.username}_{second_user.username}_direct__',
             )
             room.participant.add(first_user.id, second_user.id)
+            pin_to_primary(first_user)
         return redirect('chat:room_chatbox', room_name=room.name)
 
 
@@ -234,10 +418,24 @@ class DirectDeleteView(View, LoginRequiredMixin):
         second_user = get_object_or_404(User, username=self.kwargs.get('username'))
         if first_user == second_user:
             raise PermissionDenied
-        if Room.objects.filter(name=f'__{first_user.username}_{second_user.username}_direct__').exists():
-            room = Room.objects.get(name=f'__{first_user.username}_{second_user.username}_direct__')
-        elif Room.objects.filter(name=f'__{second_user.username}_{first_user.username}_direct__').exists():
-            room = Room.objects.get(name=f'__{second_user.username}_{first_user.username}_direct__')
-        else:
+        room = get_direct_room(first_user, second_user)
+        if room is None:
             return redirect('chat:room_list')
         return redirect('chat:room_delete', room_name=room.name)
+
+
+class ReadinessView(View):
+    """View telling load balancer if the node can serve chat rooms."""
+
+    async def get(self, request, *args, **kwargs):
+        """Handle get-request, check database and channel layers.
+
+        Args:
+            request: HTTPRequest to handle.
+
+        Returns:
+            checks results with status 200 if all passed, 503 otherwise.
+        """
+        results = await run_readiness_checks()
+        ready = all(result == 'ok' for result in results.values())
+        return JsonResponse(results, status=200 if ready else 503)
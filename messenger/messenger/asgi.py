@@ -5,13 +5,17 @@ from channels.routing import ProtocolTypeRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
 
-from messenger.chat.routing import url_router
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messenger.messenger.settings')
 
+# Sets up Django, so chat routing can import consumers and models.
+django_asgi_application = get_asgi_application()
+
+from messenger.chat.routing import channel_router, url_router  # noqa: E402
+
 application = ProtocolTypeRouter({
-    'http': get_asgi_application(),
+    'http': django_asgi_application,
     'websocket': AllowedHostsOriginValidator(
         AuthMiddlewareStack(url_router),
     ),
+    'channel': channel_router,
 })
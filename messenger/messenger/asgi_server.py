@@ -0,0 +1,299 @@
+"""Daphne server with worker processes, graceful drain and websocket compression.
+
+Run it like daphne itself:
+    python -m messenger.messenger.asgi_server --workers 4 -b 0.0.0.0 -p 8000 messenger.messenger.asgi:application
+
+With more than one worker the supervisor process binds the socket and
+starts workers sharing it. On SIGTERM every worker stops accepting
+connections, closes websockets with a reconnect code, waits for consumers
+to clean up and removes presence entries left by its sockets.
+"""
+
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from autobahn.websocket.compress import PerMessageDeflateOffer, PerMessageDeflateOfferAccept
+from daphne.cli import DEFAULT_HOST, DEFAULT_PORT, CommandLineInterface as DaphneCommandLineInterface
+from daphne.server import Server
+from daphne.ws_protocol import WebSocketProtocol
+from django.conf import settings
+from twisted.internet import reactor
+
+from messenger.chat.presence import flush_local_presence
+
+logger = logging.getLogger(__name__)
+
+FD_ENDPOINT_PREFIX = 'fd:fileno='
+DRAIN_CHECK_INTERVAL = 0.5
+RESPAWN_DELAY = 1
+# Options of the supervisor which workers don't get, they listen on the inherited socket.
+SUPERVISOR_OPTIONS = frozenset(('-b', '--bind', '-p', '--port', '--workers'))
+
+
+class CompressedWebSocketProtocol(WebSocketProtocol):
+    """Websocket protocol compressing large frames of opted-in routes."""
+
+    def onConnect(self, request):  # noqa: N802
+        """Handle websocket handshake, enabling compression negotiation.
+
+        Autobahn negotiates extensions after onConnect, so the accept hook
+        is set per connection here once the request path is known.
+
+        Args:
+            request: websocket handshake request.
+
+        Returns:
+            result of daphne handshake handling.
+        """
+        self.perMessageCompressionAccept = self.accept_compression_offer
+        return super().onConnect(request)
+
+    def accept_compression_offer(self, offers):
+        """Accept permessage-deflate offer of the client.
+
+        Args:
+            offers: compression offers from the handshake.
+
+        Returns:
+            accepted offer or None to keep the connection uncompressed.
+        """
+        if not settings.WEBSOCKET_COMPRESSION:
+            return None
+        if not self.http_request_path.startswith(tuple(settings.WEBSOCKET_COMPRESSION_PATHS)):
+            return None
+        for offer in offers:
+            if isinstance(offer, PerMessageDeflateOffer):
+                return PerMessageDeflateOfferAccept(offer)
+        return None
+
+    def serverSend(self, content, binary=False):  # noqa: N802
+        """Send frame, skipping compression of small ones.
+
+        Args:
+            content: frame payload;
+            binary: True for binary frames.
+        """
+        if self.state == self.STATE_CONNECTING:
+            self.serverAccept()
+        payload = content if binary else content.encode('utf8')
+        self.sendMessage(
+            payload,
+            binary,
+            doNotCompress=len(payload) < settings.WEBSOCKET_COMPRESSION_MIN_SIZE,
+        )
+
+
+class MessengerServer(Server):
+    """Daphne server listening on inherited sockets and draining on SIGTERM."""
+
+    def __init__(self, *args, **kwargs):
+        """Create MessengerServer object.
+
+        Twisted has no parser for daphne --fd endpoints, so the server
+        adopts such sockets itself.
+        """
+        super().__init__(*args, **kwargs)
+        self.inherited_fds = [
+            int(endpoint[len(FD_ENDPOINT_PREFIX):])
+            for endpoint in self.endpoints
+            if endpoint.startswith(FD_ENDPOINT_PREFIX)
+        ]
+        self.endpoints = [endpoint for endpoint in self.endpoints if not endpoint.startswith(FD_ENDPOINT_PREFIX)]
+        self.ports = []
+        self.draining = False
+
+    @property
+    def ws_factory(self):
+        """Get websocket factory of the server.
+
+        Returns:
+            websocket factory.
+        """
+        return self._ws_factory
+
+    @ws_factory.setter
+    def ws_factory(self, factory):
+        """Set websocket factory created by Server.run, replacing its protocol.
+
+        Args:
+            factory: websocket factory.
+        """
+        factory.protocol = CompressedWebSocketProtocol
+        self._ws_factory = factory
+
+    def run(self):
+        """Run the server."""
+        reactor.callWhenRunning(self.start_draining_support)
+        super().run()
+
+    def start_draining_support(self):
+        """Adopt inherited sockets and replace Twisted stop signals with drain."""
+        for file_descriptor in self.inherited_fds:
+            with socket.socket(fileno=file_descriptor) as inherited_socket:
+                family = inherited_socket.family
+                # Twisted expects adopted sockets in non-blocking mode.
+                inherited_socket.setblocking(False)
+                inherited_socket.detach()
+            self.listen_success(reactor.adoptStreamPort(file_descriptor, family, self.http_factory))
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, self.handle_stop_signal)
+
+    def listen_success(self, port):
+        """Remember listening port to stop it on drain.
+
+        Args:
+            port: listening port.
+        """
+        self.ports.append(port)
+        super().listen_success(port)
+
+    def handle_stop_signal(self, signal_number, frame):
+        """Start draining from the reactor thread.
+
+        Args:
+            signal_number: received signal;
+            frame: current stack frame.
+        """
+        reactor.callFromThread(self.drain)
+
+    def drain(self):
+        """Stop accepting connections and ask websocket clients to reconnect."""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info('Draining %i connections', len(self.connections))
+        for port in self.ports:
+            port.stopListening()
+        for protocol in list(self.connections):
+            if isinstance(protocol, WebSocketProtocol) and protocol.state == protocol.STATE_OPEN:
+                protocol.serverClose(code=settings.WEBSOCKET_RESTART_CLOSE_CODE)
+        self.wait_drained(time.monotonic() + settings.SERVER_DRAIN_TIMEOUT)
+
+    def wait_drained(self, deadline):
+        """Stop the server once running applications finish or time is out.
+
+        Args:
+            deadline: monotonic time to stop at anyway.
+        """
+        running = [
+            details
+            for details in self.connections.values()
+            if 'application_instance' in details and not details['application_instance'].done()
+        ]
+        if running and time.monotonic() < deadline:
+            reactor.callLater(DRAIN_CHECK_INTERVAL, self.wait_drained, deadline)
+            return
+        logger.info('Drained, %i applications left, %i presence entries flushed', len(running), flush_local_presence())
+        self.stop()
+
+
+def get_worker_args(args):
+    """Get command line arguments of worker processes.
+
+    Args:
+        args: command line arguments of the supervisor.
+
+    Returns:
+        arguments without binding and workers options.
+    """
+    worker_args = []
+    skip_value = False
+    for arg in args:
+        if skip_value:
+            skip_value = False
+            continue
+        option, separator, _ = arg.partition('=')
+        if option in SUPERVISOR_OPTIONS:
+            skip_value = not separator
+            continue
+        worker_args.append(arg)
+    return worker_args
+
+
+def supervise_workers(args, options):
+    """Bind the socket and keep worker processes running until SIGTERM.
+
+    Args:
+        args: command line arguments;
+        options: parsed command line options.
+    """
+    host = options.host or DEFAULT_HOST
+    port = options.port if options.port is not None else DEFAULT_PORT
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listening_socket = socket.create_server((host, port), family=family, backlog=socket.SOMAXCONN)
+    file_descriptor = listening_socket.fileno()
+    command = [
+        sys.executable, '-m', __spec__.name,
+        '--fd', str(file_descriptor), '--workers', '1', *get_worker_args(args),
+    ]
+    workers = {}
+    stopping = False
+
+    def start_worker():
+        worker = subprocess.Popen(command, pass_fds=(file_descriptor,))
+        workers[worker.pid] = worker
+
+    def stop_workers(signal_number, frame):
+        nonlocal stopping
+        stopping = True
+        # Connections queued on the socket would wait for nobody otherwise.
+        listening_socket.close()
+        for worker in workers.values():
+            worker.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    logger.info('Starting %i workers on %s:%s', options.workers, host, port)
+    for _ in range(options.workers):
+        start_worker()
+    while workers:
+        pid, status = os.wait()
+        worker = workers.pop(pid, None)
+        if worker is None:
+            continue
+        worker.returncode = os.waitstatus_to_exitcode(status)
+        if not stopping:
+            logger.error('Worker %i exited with code %i, restarting', pid, worker.returncode)
+            time.sleep(RESPAWN_DELAY)
+            start_worker()
+
+
+class CommandLineInterface(DaphneCommandLineInterface):
+    """Daphne command line running MessengerServer in worker processes."""
+
+    server_class = MessengerServer
+
+    def __init__(self):
+        """Create CommandLineInterface object."""
+        super().__init__()
+        self.parser.add_argument(
+            '--workers',
+            type=int,
+            default=int(os.environ.get('WORKERS') or 0),
+            help='Number of worker processes, 0 for number of CPU cores.',
+        )
+
+    def run(self, args):
+        """Run server, in worker processes if more than one is requested.
+
+        Args:
+            args: command line arguments.
+        """
+        options = self.parser.parse_args(args)
+        options.workers = options.workers or os.cpu_count()
+        if options.workers == 1 or options.file_descriptor is not None:
+            super().run(args)
+            return
+        if options.unix_socket or options.socket_strings:
+            self.parser.error('Several workers can only listen on --bind and --port.')
+        logging.basicConfig(level=logging.INFO, format=options.log_fmt)
+        supervise_workers(args, options)
+
+
+if __name__ == '__main__':
+    CommandLineInterface.entrypoint()
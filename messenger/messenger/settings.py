@@ -70,9 +70,32 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'postgres-password'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Websocket workers keep their threads for a long time, so reuse
+        # connections between events and check them before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # Server side cursors don't work through transaction pooling pgbouncer.
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER', '') == '1',
     }
 }
 
+DATABASE_REPLICAS = []
+for replica_number, replica_address in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(','))):
+    replica_host, replica_port = replica_address.rsplit(':', 1)
+    replica_alias = f'replica_{replica_number}'
+    DATABASES[replica_alias] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(replica_alias)
+
+DATABASE_ROUTERS = ['messenger.chat.routers.ReplicaRouter']
+
+# Seconds to read from the primary after user writes, covers replication lag.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,12 +124,63 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MESSAGE_ARCHIVE_DIR = Path(os.environ.get('MESSAGE_ARCHIVE_DIR', BASE_DIR / 'archive'))
+# Days to keep messages in the database, 0 keeps them forever.
+MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', '0'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', '6379'))
 REDIS_DB = 0
 REDIS_CLIENT = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+REDIS_CACHE_DB = 1
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_CACHE_DB}',
+    },
+}
+
+REDIS_BROADCAST_HOSTS = [
+    (host, int(port))
+    for host, port in (
+        address.rsplit(':', 1)
+        for address in os.environ.get('REDIS_BROADCAST_HOSTS', f'{REDIS_HOST}:{REDIS_PORT}').split(',')
+    )
+]
+
+LARGE_ROOM_CHANNEL_LAYER = 'broadcast'
+LARGE_ROOM_MEMBERS_THRESHOLD = int(os.environ.get('LARGE_ROOM_MEMBERS_THRESHOLD', '1000'))
+# Seconds channel layer of a room stays pinned after the last join, in case the last leaver never releases it.
+ROOM_LAYER_PIN_TTL = int(os.environ.get('ROOM_LAYER_PIN_TTL', '86400'))
+
+# permessage-deflate for websockets served by messenger.messenger.asgi_server.
+WEBSOCKET_COMPRESSION = os.environ.get('WEBSOCKET_COMPRESSION', '') == '1'
+WEBSOCKET_COMPRESSION_PATHS = ['/ws/chat/']
+# Smaller frames, like typing and presence events, are sent uncompressed.
+WEBSOCKET_COMPRESSION_MIN_SIZE = int(os.environ.get('WEBSOCKET_COMPRESSION_MIN_SIZE', '512'))
+
+# Sockets are closed with this code on deploy, clients reconnect to other nodes.
+WEBSOCKET_RESTART_CLOSE_CODE = 4012
+# Seconds a draining server waits for consumers to finish before stopping.
+SERVER_DRAIN_TIMEOUT = int(os.environ.get('SERVER_DRAIN_TIMEOUT', '20'))
+# Seconds every readiness check may take.
+READINESS_CHECK_TIMEOUT = float(os.environ.get('READINESS_CHECK_TIMEOUT', '2'))
+
+# Process-local cache of room id, name and type by room name.
+ROOM_CACHE_SIZE = int(os.environ.get('ROOM_CACHE_SIZE', '1024'))
+ROOM_CACHE_TTL = int(os.environ.get('ROOM_CACHE_TTL', '300'))
+# Seconds between hit ratio reports in the log.
+ROOM_CACHE_STATS_INTERVAL = int(os.environ.get('ROOM_CACHE_STATS_INTERVAL', '300'))
+
+# Rooms owned by run_room_owners processes, one process for every owner channel.
+ROOM_ACTORS = os.environ.get('ROOM_ACTORS', '') == '1'
+ROOM_OWNER_CHANNELS = [f'room-owner-{index}' for index in range(int(os.environ.get('ROOM_OWNERS', '4')))]
+ROOM_OWNER_VIRTUAL_NODES = 160
+# Messages whose readers room owner keeps in memory.
+ROOM_RECENT_MESSAGES = int(os.environ.get('ROOM_RECENT_MESSAGES', '50'))
 
 CHANNEL_LAYERS = {
     'default': {
@@ -115,4 +189,10 @@ CHANNEL_LAYERS = {
             "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
+    LARGE_ROOM_CHANNEL_LAYER: {
+        'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+        'CONFIG': {
+            "hosts": REDIS_BROADCAST_HOSTS,
+        },
+    },
 }
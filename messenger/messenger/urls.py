@@ -3,8 +3,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from messenger.chat.views import ReadinessView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('ready/', ReadinessView.as_view(), name='ready'),
     # path('', include(('chat.urls', 'chat'), namespace='chat')),
     path('chat/', include(('chat.urls', 'messenger.chat'), namespace='chat')),
 ]